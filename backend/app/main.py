@@ -4,21 +4,47 @@ TaxPilot API – FastAPI application.
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import json
 import logging
-from datetime import datetime, timedelta
-from decimal import Decimal, InvalidOperation
-from typing import Optional
+import re
+import threading
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import MAX_PREC, Context, Decimal
+from functools import lru_cache
+from itertools import chain
+from typing import (
+    IO, Annotated, Any, AsyncIterator, Iterator, Literal, Optional, get_args, get_origin,
+)
 
+import pandas as pd
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-
-from collections import defaultdict
-
-from app.models import ActionType, BrokerName, OpenPosition, TaxReport, UnifiedTransaction
-from app.parsers.detector import detect_and_parse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from pydantic import BaseModel, PydanticUserError, TypeAdapter, ValidationError
+from pydantic_core import to_json
+
+from collections import Counter, defaultdict
+
+from app.models import (
+    ZERO,
+    ActionType,
+    BrokerName,
+    CalculateResponse,
+    FileSummary,
+    ManualBuyEntry,
+    OpenPosition,
+    TaxReport,
+    UnifiedTransaction,
+    normalize_code,
+)
+from app.models_portfolio import PortfolioAnalysisReport, PortfolioAnalysisResponse
+from app.parsers.base import BaseParser, read_head
+from app.parsers.detector import detect_parser, find_parser
 from app.parsers.ibkr_performance import IBKRPerformanceParser
 from app.parsers.ike_ikze import IkeIkzeParser
 from app.services.nbp_client import NbpClient, settlement_date_for_trade
@@ -27,20 +53,76 @@ from app.services.tax_report import TaxReportGenerator
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Release the shared NBP client's HTTP connection pool on shutdown."""
+    yield
+    nbp_client.close()
+
+
 app = FastAPI(
     title="TaxPilot",
     description="Polish capital gains tax calculator for foreign broker accounts",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
+# Largest accepted single upload, checked after spooling (_check_upload_size);
+# real broker exports are a few MB at most.
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+# Largest accepted request body: several uploads plus form fields
+MAX_REQUEST_BYTES = 4 * MAX_UPLOAD_BYTES
+_REQUEST_TOO_LARGE = f"Request too large (limit {MAX_REQUEST_BYTES // (1024 * 1024)} MB)"
+
+
+class LimitRequestSizeMiddleware:
+    """Reject request bodies over MAX_REQUEST_BYTES with 413.
+
+    A declared Content-Length is checked before anything is read. Bodies
+    without one (chunked transfer encoding) are counted as they arrive, and
+    the read fails once the limit is crossed, so form parsing stops instead
+    of spooling the rest. FastAPI re-raises an HTTPException from body
+    parsing unchanged, which turns it into the 413 response.
+
+    Pure ASGI rather than @app.middleware("http") so it can wrap `receive`.
+    Registered before CORSMiddleware so the 413 still carries CORS headers.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+            response = JSONResponse(status_code=413, content={"detail": _REQUEST_TOO_LARGE})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > MAX_REQUEST_BYTES:
+                    raise HTTPException(status_code=413, detail=_REQUEST_TOO_LARGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(LimitRequestSizeMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000", "http://localhost:3001",
-        "http://127.0.0.1:3000", "http://127.0.0.1:3001",
-        "http://andrzej240.mikrus.xyz",
-        "https://andrzej240.mikrus.xyz",
-    ],
+    # Local dev servers on :3000/:3001 and the production host (http/https);
+    # compiled once by Starlette and matched with fullmatch
+    allow_origin_regex=r"http://(localhost|127\.0\.0\.1):300[01]|https?://andrzej240\.mikrus\.xyz",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -49,91 +131,289 @@ app.add_middleware(
 # Singleton NBP client (shared across requests, with cache)
 nbp_client = NbpClient()
 
+# Stateless parsers / generator, shared across requests like nbp_client
+perf_parser = IBKRPerformanceParser()
+ike_parser = IkeIkzeParser()
+tax_generator = TaxReportGenerator(nbp_client)
+
+
+def _json_response(payload: Any) -> Response:
+    """Serialize a response in one pass with pydantic-core's JSON serializer.
+
+    `payload` may be a model or plain data containing models; Decimal, date
+    and enum values are encoded natively. Returning a Response also skips
+    FastAPI's jsonable_encoder walk and the stdlib json pass of JSONResponse.
+    """
+    return Response(content=to_json(payload), media_type="application/json")
+
+
+# Target size of the chunks written by _stream_json_response
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+
+@lru_cache(maxsize=None)
+def _field_adapter(model: type[BaseModel], name: str, item: bool = False) -> TypeAdapter:
+    """Serializer for one field of `model` (or for one item of a list field).
+
+    Built from the declared type, any Annotated metadata and the model's
+    config, so it encodes values exactly as model_dump_json() would.
+    """
+    field = model.model_fields[name]
+    if item:
+        target = get_args(field.annotation)[0]
+    elif field.metadata:
+        target = Annotated[(field.annotation, *field.metadata)]
+    else:
+        target = field.annotation
+    try:
+        return TypeAdapter(target, config=model.model_config or None)
+    except PydanticUserError:
+        # Models and dataclasses bring their own config
+        return TypeAdapter(target)
+
+
+def _walks_fields(model: type[BaseModel]) -> bool:
+    """Whether `model` can be encoded field by field (no custom serialization)."""
+    decorators = model.__pydantic_decorators__
+    return not (
+        decorators.field_serializers
+        or decorators.model_serializers
+        or decorators.computed_fields
+        or any(field.exclude for field in model.model_fields.values())
+    )
+
+
+def _iter_json(value: BaseModel) -> Iterator[bytes]:
+    """Yield the JSON encoding of a response model piece by piece.
+
+    Models are walked field by field and list fields item by item, so only one
+    list item (e.g. one FifoMatch) is encoded at a time. Every piece goes
+    through the serializer of its declared type, so the bytes match
+    model_dump_json(); models with custom serialization are encoded whole.
+    """
+    model = type(value)
+    if not _walks_fields(model):
+        yield value.model_dump_json().encode()
+        return
+    yield b"{"
+    for i, (name, field) in enumerate(model.model_fields.items()):
+        yield (b',"' if i else b'"') + name.encode() + b'":'
+        field_value = getattr(value, name)
+        # Annotated metadata may change how the value serializes as a whole
+        annotation = None if field.metadata else field.annotation
+        if isinstance(field_value, BaseModel) and type(field_value) is annotation:
+            yield from _iter_json(field_value)
+        elif isinstance(field_value, list) and get_origin(annotation) is list:
+            item_adapter = _field_adapter(model, name, item=True)
+            yield b"["
+            for j, item in enumerate(field_value):
+                if j:
+                    yield b","
+                yield item_adapter.dump_json(item)
+            yield b"]"
+        else:
+            yield _field_adapter(model, name).dump_json(field_value)
+    yield b"}"
+
+
+def _iter_json_chunks(payload: BaseModel) -> Iterator[bytes]:
+    buffer = bytearray()
+    for piece in _iter_json(payload):
+        buffer += piece
+        if len(buffer) >= _STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _stream_json_response(payload: BaseModel) -> StreamingResponse:
+    """Stream a large response model as JSON instead of encoding it in one go.
+
+    The first chunk is encoded before the response starts: an encoding error
+    in it still becomes a normal 500, and reports smaller than a chunk are
+    complete before any header is sent. The rest is produced in a worker
+    thread as the client reads it, so the event loop is not blocked and
+    peak memory stays at one chunk.
+    """
+    chunks = _iter_json_chunks(payload)
+    first = next(chunks, b"")
+    return StreamingResponse(chain((first,), chunks), media_type="application/json")
+
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
 
-def _build_manual_transactions(manual_buys_json: str) -> tuple[list[UnifiedTransaction], list[str]]:
-    """Parse manual buy entries from JSON and create UnifiedTransaction objects.
+# Compiled once at import: validates the whole manual_buys payload in a single
+# JSON parse + validation pass.
+_MANUAL_BUYS_ADAPTER = TypeAdapter(list[ManualBuyEntry])
+_TRANSACTIONS_ADAPTER = TypeAdapter(list[UnifiedTransaction])
 
-    Returns (transactions, warnings) tuple.
+# Per-row fields returned by /api/parse-preview, and how many rows it returns
+_PREVIEW_ROWS = 100
+_PREVIEW_FIELDS = {
+    "__all__": {
+        "symbol", "action", "quantity", "price",
+        "currency", "trade_date", "commission", "isin",
+    },
+}
+
+
+# Cap on exception text echoed into logs and HTTP error details; parser
+# errors can quote whole rows of the uploaded file.
+_MAX_ERROR_CHARS = 500
+
+
+def _error_text(exc: BaseException) -> str:
+    """str(exc), truncated to _MAX_ERROR_CHARS."""
+    text = str(exc)
+    if len(text) > _MAX_ERROR_CHARS:
+        return text[:_MAX_ERROR_CHARS] + "..."
+    return text
+
+
+def _validate_manual_entries(manual_buys_json: str) -> tuple[list[ManualBuyEntry], list[str]]:
+    """Validate manual buy entries one by one.
+
+    Slow path used only when the bulk validation fails, so that a single bad
+    entry is skipped with a warning instead of rejecting the whole payload.
     """
     try:
-        entries = json.loads(manual_buys_json)
+        raw_entries = json.loads(manual_buys_json)
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid manual_buys JSON: {e}")
+    if not isinstance(raw_entries, list):
+        raise ValueError("Invalid manual_buys JSON: expected a list of entries")
 
-    transactions = []
-    skipped = []
-    for entry in entries:
-        symbol = entry.get("symbol", "").strip().upper()
+    entries: list[ManualBuyEntry] = []
+    skipped: list[str] = []
+    for raw in raw_entries:
+        symbol = normalize_code(str(raw.get("symbol") or "")) if isinstance(raw, dict) else ""
         if not symbol:
-            skipped.append(f"Pominięto wpis bez symbolu")
+            skipped.append("Pominięto wpis bez symbolu")
             continue
 
         try:
-            trade_date_str = entry.get("tradeDate", "")
-            if not trade_date_str:
+            entries.append(ManualBuyEntry.model_validate(raw))
+        except ValidationError as e:
+            errors = e.errors()
+            if not raw.get("tradeDate"):
                 skipped.append(f"Pominięto {symbol}: brak daty")
-                continue
-            trade_dt = datetime.strptime(trade_date_str, "%Y-%m-%d").replace(hour=12)
-
-            qty = Decimal(str(entry.get("quantity", "0")))
-            price = Decimal(str(entry.get("price", "0")))
-            if qty <= 0 or price <= 0:
+            elif any(err["type"] == "greater_than" for err in errors):
                 skipped.append(f"Pominięto {symbol}: ilość lub cena <= 0")
-                continue
-
-            currency = entry.get("currency", "USD").upper()
-            commission = Decimal(str(entry.get("commission", "0")))
-
-            settle = settlement_date_for_trade(trade_dt.date(), "US" if currency == "USD" else "")
-
-            raw_id = f"MANUAL_{symbol}_{trade_date_str}_{qty}_{price}"
-            tx_id = hashlib.sha256(raw_id.encode()).hexdigest()[:16]
-
-            transactions.append(UnifiedTransaction(
-                id=tx_id,
-                broker=BrokerName.MANUAL,
-                symbol=symbol,
-                isin=None,
-                description="Reczne kupno",
-                trade_date=trade_dt,
-                settlement_date=settle,
-                action=ActionType.BUY,
-                quantity=qty,
-                price=price,
-                currency=currency,
-                commission=commission,
-            ))
-        except (ValueError, InvalidOperation) as e:
-            skipped.append(f"Pominięto {symbol}: {e}")
-            logger.warning("Skipping invalid manual buy entry %s: %s", entry, e)
+            else:
+                skipped.append(f"Pominięto {symbol}: {errors[0]['msg']}")
+            # Entry-level detail only; the skip reason is returned to the user
+            logger.debug("Skipping invalid manual buy entry %s: %s", raw, e)
+
+    return entries, skipped
+
+
+def _build_manual_transactions(manual_buys_json: str) -> tuple[list[UnifiedTransaction], list[str]]:
+    """Parse manual buy entries from JSON and create UnifiedTransaction objects.
+
+    Returns (transactions, warnings) tuple.
+    """
+    try:
+        entries = _MANUAL_BUYS_ADAPTER.validate_json(manual_buys_json)
+        skipped: list[str] = []
+    except ValidationError:
+        entries, skipped = _validate_manual_entries(manual_buys_json)
+
+    transactions = []
+    for entry in entries:
+        trade_dt = datetime.combine(entry.trade_date, time(12))
+        settle = settlement_date_for_trade(entry.trade_date, "US" if entry.currency == "USD" else "")
+
+        raw_id = f"MANUAL_{entry.symbol}_{entry.trade_date.isoformat()}_{entry.quantity}_{entry.price}"
+        tx_id = hashlib.blake2b(raw_id.encode(), digest_size=8).hexdigest()
+
+        # Trusted internal data, validated upstream by ManualBuyEntry
+        transactions.append(UnifiedTransaction.from_parser(
+            id=tx_id,
+            broker=BrokerName.MANUAL,
+            symbol=entry.symbol,
+            isin=None,
+            description="Reczne kupno",
+            trade_date=trade_dt,
+            settlement_date=settle,
+            action=ActionType.BUY,
+            quantity=entry.quantity,
+            price=entry.price,
+            currency=entry.currency,
+            commission=entry.commission,
+        ))
 
     return transactions, skipped
 
 
+# Date formats seen in the Performance report "AnalysisPeriod" field, each
+# behind a cheap shape check so no parse is attempted just to fail.
+# A None format means ISO 8601 (datetime.fromisoformat).
+_PERIOD_FORMAT_PROBES = (
+    (re.compile(r"\d{4}-?\d{2}-?\d{2}(?:[T ].*)?"), None),
+    (re.compile(r"[A-Za-z]+ \d{1,2}, \d{4}"), "%B %d, %Y"),
+    (re.compile(r"\d{4}-\d{1,2}-\d{1,2}"), "%Y-%m-%d"),
+    (re.compile(r"\d{1,2}/\d{1,2}/\d{4}"), "%m/%d/%Y"),
+)
+
+
+@lru_cache(maxsize=128)
+def _parse_period(value: str) -> Optional[datetime]:
+    """Parse a Performance report period date, e.g. 'September 29, 2023'."""
+    for probe, fmt in _PERIOD_FORMAT_PROBES:
+        if not probe.fullmatch(value):
+            continue
+        try:
+            return datetime.fromisoformat(value) if fmt is None else datetime.strptime(value, fmt)
+        except ValueError:
+            # Right shape but not a real date (e.g. month 13)
+            continue
+    return None
+
+
 def _supplement_open_positions(report: TaxReport, perf_report, nbp_client: NbpClient) -> None:
     """
     Add open positions from Performance report that aren't covered by FIFO.
     This handles positions bought before the Activity Statement period.
     """
-    # Aggregate FIFO open position quantities per symbol
-    fifo_qty: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
+    # Aggregate FIFO open position quantities per symbol (exact Decimal sums:
+    # fractional shares may carry more places than any fixed scale)
+    fifo_qty: dict[str, Decimal] = {}
     for pos in report.open_positions:
-        fifo_qty[pos.symbol] += pos.quantity
+        fifo_qty[pos.symbol] = fifo_qty.get(pos.symbol, ZERO) + pos.quantity
 
-    for pa_pos in perf_report.open_positions:
-        fifo_has = fifo_qty.get(pa_pos.symbol, Decimal("0"))
-        shortfall = pa_pos.quantity - fifo_has
+    # Use report period_start as approximate buy date (same for every position)
+    buy_date_dt = _parse_period(perf_report.period_start)
+    buy_dt = (buy_date_dt or datetime(2020, 1, 2)).date()
 
+    # First pass: positions FIFO doesn't fully cover, and the settlement
+    # dates whose NBP rates they need
+    pending = []
+    needed: dict[str, set[date]] = defaultdict(set)
+    for pa_pos in perf_report.open_positions:
+        shortfall = pa_pos.quantity - fifo_qty.get(pa_pos.symbol, ZERO)
         if shortfall <= 0:
             continue
 
         currency = _normalize_currency(pa_pos.currency or "USD")
+        settle = settlement_date_for_trade(buy_dt, "US" if currency == "USD" else "")
+        pending.append((pa_pos, shortfall, currency, settle))
+        needed[currency].add(settle)
+
+    # One batched NBP lookup per currency instead of one per position
+    rates: dict[tuple[str, date], Decimal] = {}
+    for currency, dates in needed.items():
+        try:
+            found = nbp_client.get_rates(currency, dates)
+        except Exception:
+            continue
+        for settle, (rate, _) in found.items():
+            rates[(currency, settle)] = rate
 
+    for pa_pos, shortfall, currency, settle in pending:
         # Compute avg price from cost_basis / quantity
         avg_price = (
             (pa_pos.cost_basis / pa_pos.quantity).quantize(Decimal("0.0001"))
@@ -141,22 +421,8 @@ def _supplement_open_positions(report: TaxReport, perf_report, nbp_client: NbpCl
             else Decimal("0")
         )
 
-        # Use report period_start as approximate buy date
-        buy_date_dt = None
-        for fmt in ("%B %d, %Y", "%Y-%m-%d", "%m/%d/%Y"):
-            try:
-                buy_date_dt = datetime.strptime(perf_report.period_start, fmt)
-                break
-            except ValueError:
-                continue
-        buy_dt = (buy_date_dt or datetime(2020, 1, 2)).date()
-
-        # Get NBP rate
-        try:
-            settle = settlement_date_for_trade(buy_dt, "US" if currency == "USD" else "")
-            rate, _ = nbp_client.get_rate(currency, settle)
-        except Exception:
-            rate = Decimal("1")
+        # Positions whose rate could not be found fall back to 1
+        rate = rates.get((currency, settle), Decimal("1"))
 
         cost_pln = (avg_price * shortfall * rate).quantize(Decimal("0.01"))
 
@@ -218,32 +484,31 @@ def _build_supplementary_buys(
     Returns (synthetic_transactions, warnings).
     """
     # Count per-symbol buy/sell quantities and find earliest sell date
-    symbol_buys: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
-    symbol_sells: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
+    symbol_buys: dict[str, Decimal] = {}
+    symbol_sells: dict[str, Decimal] = {}
     earliest_sell: dict[str, datetime] = {}
 
+    # Enum members are singletons: bind them locally and compare by identity
+    buy, sell = ActionType.BUY, ActionType.SELL
     for tx in existing_transactions:
-        if tx.action == ActionType.BUY:
-            symbol_buys[tx.symbol] += tx.quantity
-        elif tx.action == ActionType.SELL:
-            symbol_sells[tx.symbol] += tx.quantity
+        action = tx.action
+        if action is buy:
+            symbol_buys[tx.symbol] = symbol_buys.get(tx.symbol, ZERO) + tx.quantity
+        elif action is sell:
+            symbol_sells[tx.symbol] = symbol_sells.get(tx.symbol, ZERO) + tx.quantity
             if tx.symbol not in earliest_sell or tx.trade_date < earliest_sell[tx.symbol]:
                 earliest_sell[tx.symbol] = tx.trade_date
 
-    # Build lookup from Performance report Trade Summary
-    trade_lookup = {ts.symbol: ts for ts in perf_report.trade_summaries}
-
     supplementary = []
     warnings = []
 
     for symbol, sell_qty in symbol_sells.items():
-        buy_qty = symbol_buys.get(symbol, Decimal("0"))
-        shortfall = sell_qty - buy_qty
+        shortfall = sell_qty - symbol_buys.get(symbol, ZERO)
 
         if shortfall <= 0:
             continue
 
-        trade_data = trade_lookup.get(symbol)
+        trade_data = perf_report.trade_lookup.get(symbol)
         if not trade_data or trade_data.avg_buy_price <= 0:
             continue
 
@@ -264,9 +529,10 @@ def _build_supplementary_buys(
         )
 
         raw_id = f"PERF_SUPPLEMENT_{symbol}_{shortfall}_{price}"
-        tx_id = hashlib.sha256(raw_id.encode()).hexdigest()[:16]
+        tx_id = hashlib.blake2b(raw_id.encode(), digest_size=8).hexdigest()
 
-        tx = UnifiedTransaction(
+        # Trusted internal data, validated upstream by the Performance parser
+        tx = UnifiedTransaction.from_parser(
             id=tx_id,
             broker=BrokerName.MANUAL,
             symbol=symbol,
@@ -292,6 +558,46 @@ def _build_supplementary_buys(
     return supplementary, warnings
 
 
+# Largest value an int64 column can hold
+_INT64_MAX = 2**63 - 1
+
+# Unbounded precision, so scaleb() below never rounds
+_EXACT_CONTEXT = Context(prec=MAX_PREC)
+
+
+def _exact_qty_units(quantities: list[Decimal]) -> Optional[list[int]]:
+    """Quantities as ints at their finest common decimal scale, or None.
+
+    Scaling every quantity by the same power of ten loses nothing, so sums
+    and comparisons on the ints agree exactly with Decimal arithmetic.
+    Returns None when a group sum could overflow int64.
+    """
+    if not quantities:
+        return []
+    places = max(0, -min(q.as_tuple().exponent for q in quantities))
+    units = [int(q.scaleb(places, _EXACT_CONTEXT)) for q in quantities]
+    if max(map(abs, units)) * len(units) > _INT64_MAX:
+        return None
+    return units
+
+
+# Actions that take part in aggregate-fill dedup
+_TRADE_ACTIONS = frozenset({ActionType.BUY, ActionType.SELL})
+
+
+def _find_aggregate_rows(frame: pd.DataFrame, keys: list[str]) -> list[int]:
+    """Row labels whose qty equals the sum of the other rows in their group.
+
+    Only the largest row of each group (first one on ties) is a candidate.
+    """
+    if frame.empty:
+        return []
+    grouped = frame.groupby(keys, sort=False)["qty"]
+    largest = grouped.max()
+    is_aggregate = (grouped.size() > 1) & (grouped.sum() - largest == largest)
+    return grouped.idxmax()[is_aggregate].tolist()
+
+
 def _dedup_transactions(transactions: list[UnifiedTransaction]) -> list[UnifiedTransaction]:
     """Remove duplicate transactions from overlapping files.
 
@@ -321,54 +627,186 @@ def _dedup_transactions(transactions: list[UnifiedTransaction]) -> list[UnifiedT
     if id_dupes:
         logger.info("Deduplicated %d exact-ID duplicates", id_dupes)
 
-    # Pass 2: same-price aggregate dedup
-    groups: dict[tuple, list[int]] = defaultdict(list)
-    for i, tx in enumerate(deduped):
-        if tx.action in (ActionType.BUY, ActionType.SELL):
-            key = (tx.symbol, tx.trade_date, tx.action, tx.price)
-            groups[key].append(i)
-
-    remove_indices: set[int] = set()
-    for key, indices in groups.items():
-        if len(indices) <= 1:
-            continue
-        quantities = [(i, deduped[i].quantity) for i in indices]
-        quantities.sort(key=lambda x: x[1], reverse=True)
-        largest_i, largest_q = quantities[0]
-        rest_sum = sum(q for _, q in quantities[1:])
-        if rest_sum == largest_q:
-            remove_indices.add(largest_i)
+    # Passes 2 and 3 run as pandas group-bys over one frame of the trades.
+    # Quantities are compared as exact integer units (see _exact_qty_units),
+    # or as the Decimals themselves when those would not fit int64.
+    trades = [(i, tx) for i, tx in enumerate(deduped) if tx.action in _TRADE_ACTIONS]
+
+    # Every pass 2/3 group is a set of trades sharing (symbol, datetime,
+    # action). If no two trades share one – the usual single-file case –
+    # neither pass can remove anything, so skip building the frame.
+    if len({(tx.symbol, tx.trade_date, tx.action) for _, tx in trades}) == len(trades):
+        return deduped
+
+    quantities = [tx.quantity for _, tx in trades]
+    units = _exact_qty_units(quantities)
+    frame = pd.DataFrame(
+        {
+            "symbol": [tx.symbol for _, tx in trades],
+            "trade_date": [tx.trade_date for _, tx in trades],
+            "action": [tx.action.value for _, tx in trades],
+            "price": [tx.price for _, tx in trades],
+            "qty": quantities if units is None else units,
+        },
+        index=[i for i, _ in trades],
+        dtype=object,
+    )
+    if units is not None:
+        frame = frame.astype({"qty": "int64"})
 
+    # Pass 2: same-price aggregate dedup
+    remove_indices = set(_find_aggregate_rows(frame, ["symbol", "trade_date", "action", "price"]))
     if remove_indices:
         logger.info("Removed %d same-price aggregate duplicates", len(remove_indices))
-        deduped = [tx for i, tx in enumerate(deduped) if i not in remove_indices]
 
     # Pass 3: blended-price aggregate dedup
-    # Group by (symbol, datetime, action) WITHOUT price — catches blended-price aggregates
-    time_groups: dict[tuple, list[int]] = defaultdict(list)
-    for i, tx in enumerate(deduped):
-        if tx.action in (ActionType.BUY, ActionType.SELL):
-            key = (tx.symbol, tx.trade_date, tx.action)
-            time_groups[key].append(i)
-
-    remove_blended: set[int] = set()
-    for key, indices in time_groups.items():
-        if len(indices) <= 1:
-            continue
-        quantities = [(i, deduped[i].quantity) for i in indices]
-        quantities.sort(key=lambda x: x[1], reverse=True)
-        largest_i, largest_q = quantities[0]
-        rest_sum = sum(q for _, q in quantities[1:])
-        if rest_sum == largest_q:
-            remove_blended.add(largest_i)
-
+    # Group by (symbol, datetime, action) WITHOUT price — catches blended-price
+    # aggregates. Rows already removed by pass 2 don't take part.
+    remaining = frame.drop(index=list(remove_indices))
+    remove_blended = set(_find_aggregate_rows(remaining, ["symbol", "trade_date", "action"]))
     if remove_blended:
         logger.info("Removed %d blended-price aggregate duplicates", len(remove_blended))
-        deduped = [tx for i, tx in enumerate(deduped) if i not in remove_blended]
+
+    remove = remove_indices | remove_blended
+    if remove:
+        deduped = [tx for i, tx in enumerate(deduped) if i not in remove]
 
     return deduped
 
 
+UploadKind = Literal["performance", "transactions"]
+
+# Detection verdicts keyed by (blake2b of the file prefix, filename), so the
+# same file re-uploaded across retries/endpoints isn't sniffed again.
+_DETECT_CACHE_SIZE = 256
+_detect_cache: dict[tuple[bytes, str], tuple[UploadKind, Optional[type[BaseParser]]]] = {}
+_detect_cache_lock = threading.Lock()
+
+
+def _detect_kind(
+    head: str | bytes, filename: str,
+) -> tuple[UploadKind, Optional[type[BaseParser]]]:
+    """Classify an upload from its prefix (see parsers.base.read_head).
+
+    Returns the kind and, for transaction files, the matching broker parser
+    (None if no registered parser recognises the file).
+    """
+    raw = head.encode() if isinstance(head, str) else head
+    key = (hashlib.blake2b(raw, digest_size=16).digest(), filename)
+    with _detect_cache_lock:
+        verdict = _detect_cache.get(key)
+    if verdict is not None:
+        return verdict
+
+    if perf_parser.detect(head, filename):
+        verdict = ("performance", None)
+    else:
+        verdict = ("transactions", find_parser(head, filename))
+
+    with _detect_cache_lock:
+        if len(_detect_cache) >= _DETECT_CACHE_SIZE:
+            # Evict the oldest entry (dicts keep insertion order)
+            del _detect_cache[next(iter(_detect_cache))]
+        _detect_cache[key] = verdict
+    return verdict
+
+
+def _parse_performance_upload(
+    content: IO[bytes], filename: str, parser_cls: Optional[type[BaseParser]],
+) -> tuple[Optional[PortfolioAnalysisReport], list[UnifiedTransaction], FileSummary]:
+    # Parse as supplementary data (not rejected outright)
+    perf_report = perf_parser.parse(content, filename)
+    logger.info(
+        "Parsed Performance report %s as supplementary data", filename,
+    )
+    return perf_report, [], FileSummary(
+        filename=filename,
+        broker="IBKR",
+        transactions_count=0,
+        buys=0,
+        sells=0,
+        dividends=0,
+        wht=0,
+        note="Raport Performance — uzyte jako uzupelnienie danych historycznych",
+    )
+
+
+def _parse_transactions_upload(
+    content: IO[bytes], filename: str, parser_cls: Optional[type[BaseParser]],
+) -> tuple[Optional[PortfolioAnalysisReport], list[UnifiedTransaction], FileSummary]:
+    if parser_cls is None:
+        # Raises the "could not detect broker format" error
+        parser_cls = detect_parser(read_head(content), filename)
+    transactions = parser_cls().parse(content, filename)
+
+    broker = transactions[0].broker if transactions else "?"
+    action_counts = Counter(t.action for t in transactions)
+    logger.info(
+        "Parsed %s: %d transactions from %s",
+        filename, len(transactions), broker,
+    )
+    return None, transactions, FileSummary(
+        filename=filename,
+        broker=broker,
+        transactions_count=len(transactions),
+        buys=action_counts[ActionType.BUY],
+        sells=action_counts[ActionType.SELL],
+        dividends=action_counts[ActionType.DIVIDEND],
+        wht=action_counts[ActionType.TAX_WHT],
+    )
+
+
+_UPLOAD_PARSERS = {
+    "performance": _parse_performance_upload,
+    "transactions": _parse_transactions_upload,
+}
+
+
+def _parse_upload(
+    content: IO[bytes], filename: str,
+) -> tuple[Optional[PortfolioAnalysisReport], list[UnifiedTransaction], FileSummary]:
+    """Parse one uploaded file (blocking – runs in a worker thread).
+
+    Returns (perf_report, transactions, file_summary); perf_report is set only
+    for IBKR Performance reports, which carry no transactions. The file prefix
+    is read once and shared by all detect() calls.
+    """
+    kind, parser_cls = _detect_kind(read_head(content), filename)
+    return _UPLOAD_PARSERS[kind](content, filename, parser_cls)
+
+
+def _check_upload_size(uploaded_file: UploadFile) -> None:
+    """Reject an upload over the per-file limit with 413.
+
+    This is a post-spool check: UploadFile.size is only known once Starlette
+    has written the whole part to its spooled temp file. It keeps a single
+    oversized file out of the parsers; LimitRequestSizeMiddleware is what
+    bounds how much of a request body is read at all.
+    """
+    if uploaded_file.size is not None and uploaded_file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File '{uploaded_file.filename or 'unknown'}' is too large "
+                   f"(limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)",
+        )
+
+
+async def _process_file(
+    uploaded_file: UploadFile,
+) -> tuple[Optional[PortfolioAnalysisReport], list[UnifiedTransaction], FileSummary]:
+    """Parse an upload straight from its spooled file, off the event loop.
+
+    The file is closed as soon as it is parsed, releasing its spool buffer
+    (or temp file) instead of holding every upload until the response.
+    """
+    await uploaded_file.seek(0)
+    filename = uploaded_file.filename or "unknown"
+    try:
+        return await asyncio.to_thread(_parse_upload, uploaded_file.file, filename)
+    finally:
+        await uploaded_file.close()
+
+
 @app.post("/api/calculate")
 async def calculate_tax(
     files: list[UploadFile] = File(...),
@@ -389,8 +827,11 @@ async def calculate_tax(
     if tax_year < 2000 or tax_year > 2030:
         raise HTTPException(status_code=400, detail="Invalid tax year")
 
+    for uploaded_file in files:
+        _check_upload_size(uploaded_file)
+
     all_transactions = []
-    file_summaries = []
+    file_summaries: list[FileSummary] = []
     manual_warnings: list[str] = []
 
     # Process manual buy entries
@@ -399,83 +840,52 @@ async def calculate_tax(
             manual_txs, manual_warnings = _build_manual_transactions(manual_buys)
             all_transactions.extend(manual_txs)
             if manual_txs:
-                file_summaries.append({
-                    "filename": "Reczne kupna",
-                    "broker": "MANUAL",
-                    "transactions_count": len(manual_txs),
-                    "buys": len(manual_txs),
-                    "sells": 0,
-                    "dividends": 0,
-                    "wht": 0,
-                })
+                file_summaries.append(FileSummary(
+                    filename="Reczne kupna",
+                    broker="MANUAL",
+                    transactions_count=len(manual_txs),
+                    buys=len(manual_txs),
+                    sells=0,
+                    dividends=0,
+                    wht=0,
+                ))
                 logger.info("Added %d manual buy transactions", len(manual_txs))
         except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
+            raise HTTPException(status_code=400, detail=_error_text(e))
 
-    perf_parser = IBKRPerformanceParser()
     perf_report = None
     perf_filenames = []
     has_activity_statement = False
 
-    for uploaded_file in files:
-        try:
-            content = await uploaded_file.read()
-            filename = uploaded_file.filename or "unknown"
-
-            # Check if this is a Performance report
-            if perf_parser.detect(content, filename):
-                # Parse as supplementary data (not rejected outright)
-                perf_report = perf_parser.parse(content, filename)
-                perf_filenames.append(filename)
-                file_summaries.append({
-                    "filename": filename,
-                    "broker": "IBKR",
-                    "transactions_count": 0,
-                    "buys": 0,
-                    "sells": 0,
-                    "dividends": 0,
-                    "wht": 0,
-                    "note": "Raport Performance — uzyte jako uzupelnienie danych historycznych",
-                })
-                logger.info(
-                    "Parsed Performance report %s as supplementary data", filename,
-                )
-                continue
-
-            transactions = detect_and_parse(content, filename)
-            all_transactions.extend(transactions)
-            has_activity_statement = True
-
-            broker = transactions[0].broker if transactions else "?"
-            file_summaries.append({
-                "filename": filename,
-                "broker": broker,
-                "transactions_count": len(transactions),
-                "buys": sum(1 for t in transactions if t.action.value == "BUY"),
-                "sells": sum(1 for t in transactions if t.action.value == "SELL"),
-                "dividends": sum(1 for t in transactions if t.action.value == "DIVIDEND"),
-                "wht": sum(1 for t in transactions if t.action.value == "TAX_WHT"),
-            })
-
-            logger.info(
-                "Parsed %s: %d transactions from %s",
-                filename, len(transactions), broker,
-            )
-
-        except HTTPException:
-            raise
-        except ValueError as e:
+    # Parse all files concurrently in worker threads; merge in upload order
+    results = await asyncio.gather(
+        *(_process_file(uploaded_file) for uploaded_file in files),
+        return_exceptions=True,
+    )
+    for uploaded_file, result in zip(files, results):
+        if isinstance(result, HTTPException):
+            raise result
+        if isinstance(result, ValueError):
             raise HTTPException(
                 status_code=400,
-                detail=f"Error processing file '{uploaded_file.filename}': {str(e)}",
+                detail=f"Error processing file '{uploaded_file.filename}': {_error_text(result)}",
             )
-        except Exception as e:
-            logger.error("Unexpected error parsing %s: %s", uploaded_file.filename, e)
+        if isinstance(result, BaseException):
+            logger.error("Unexpected error parsing %s: %s", uploaded_file.filename, _error_text(result))
             raise HTTPException(
                 status_code=500,
                 detail=f"Internal error processing '{uploaded_file.filename}'",
             )
 
+        file_perf_report, transactions, summary = result
+        file_summaries.append(summary)
+        if file_perf_report is not None:
+            perf_report = file_perf_report
+            perf_filenames.append(summary.filename)
+        else:
+            all_transactions.extend(transactions)
+            has_activity_statement = True
+
     # If ONLY Performance report(s) uploaded (no Activity Statements)
     if perf_filenames and not has_activity_statement:
         raise HTTPException(
@@ -505,15 +915,15 @@ async def calculate_tax(
         )
         if supplementary_buys:
             all_transactions.extend(supplementary_buys)
-            file_summaries.append({
-                "filename": "Uzupelnienia z raportu Performance",
-                "broker": "IBKR (Performance)",
-                "transactions_count": len(supplementary_buys),
-                "buys": len(supplementary_buys),
-                "sells": 0,
-                "dividends": 0,
-                "wht": 0,
-            })
+            file_summaries.append(FileSummary(
+                filename="Uzupelnienia z raportu Performance",
+                broker="IBKR (Performance)",
+                transactions_count=len(supplementary_buys),
+                buys=len(supplementary_buys),
+                sells=0,
+                dividends=0,
+                wht=0,
+            ))
             logger.info(
                 "Added %d supplementary buy transactions from Performance report",
                 len(supplementary_buys),
@@ -521,29 +931,26 @@ async def calculate_tax(
 
     # Generate tax report
     try:
-        generator = TaxReportGenerator(nbp_client)
         loss = Decimal(str(prior_year_loss)) if prior_year_loss else None
-        report = generator.generate(all_transactions, tax_year, loss)
+        report = tax_generator.generate(all_transactions, tax_year, loss)
         # Prepend warnings so user sees them first
         prepend = manual_warnings + supplementary_warnings
         if prepend:
             report.warnings = prepend + report.warnings
     except Exception as e:
-        logger.error("Tax calculation error: %s", e, exc_info=True)
+        logger.error("Tax calculation error: %s", _error_text(e), exc_info=True)
         raise HTTPException(
             status_code=500,
-            detail=f"Tax calculation error: {str(e)}",
+            detail=f"Tax calculation error: {_error_text(e)}",
         )
 
     # Supplement open positions from Performance report
     # (covers positions bought before the Activity Statement period)
     if perf_report and perf_report.open_positions:
-        _supplement_open_positions(report, perf_report, nbp_client)
+        # Blocking NBP lookups – keep them off the event loop
+        await asyncio.to_thread(_supplement_open_positions, report, perf_report, nbp_client)
 
-    return {
-        "files": file_summaries,
-        "report": report.model_dump(mode="json"),
-    }
+    return _stream_json_response(CalculateResponse(files=file_summaries, report=report))
 
 
 @app.post("/api/parse-preview")
@@ -554,32 +961,29 @@ async def parse_preview(
     Upload a single file and get a preview of parsed transactions.
     Useful for the user to verify data before running full calculation.
     """
+    _check_upload_size(file)
     try:
-        content = await file.read()
+        await file.seek(0)
         filename = file.filename or "unknown"
-        transactions = detect_and_parse(content, filename)
-
-        return {
+        # Reuse the cached upload classification; detect_parser only runs
+        # (and raises) when no transaction parser matched
+        head = read_head(file.file)
+        parser_cls = _detect_kind(head, filename)[1] or detect_parser(head, filename)
+        # The whole file is parsed: "count" reports every transaction and
+        # the preview shows the earliest-dated ones, not the first read
+        transactions = parser_cls().parse(file.file, filename)
+
+        return _json_response({
             "filename": filename,
             "broker": transactions[0].broker if transactions else None,
             "count": len(transactions),
-            "transactions": [
-                {
-                    "symbol": t.symbol,
-                    "action": t.action.value,
-                    "quantity": str(t.quantity),
-                    "price": str(t.price),
-                    "currency": t.currency,
-                    "trade_date": t.trade_date.isoformat(),
-                    "commission": str(t.commission),
-                    "isin": t.isin,
-                }
-                for t in transactions[:100]  # Limit preview to 100 rows
-            ],
-        }
+            "transactions": _TRANSACTIONS_ADAPTER.dump_python(
+                transactions[:_PREVIEW_ROWS], mode="json", include=_PREVIEW_FIELDS,
+            ),
+        })
 
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=400, detail=_error_text(e))
 
 
 @app.post("/api/portfolio-analysis")
@@ -592,33 +996,31 @@ async def portfolio_analysis(
 
     This is a separate flow from /api/calculate (tax calculation).
     """
+    _check_upload_size(file)
     try:
-        content = await file.read()
+        await file.seek(0)
+        content = file.file
         filename = file.filename or "unknown"
 
-        parser = IBKRPerformanceParser()
-        if not parser.detect(content, filename):
+        if _detect_kind(read_head(content), filename)[0] != "performance":
             raise HTTPException(
                 status_code=400,
                 detail="Plik nie wyglada na raport IBKR Performance/Portfolio Analyst. "
                        "Upewnij sie, ze wgrywasz raport Performance (nie Flex Query).",
             )
 
-        report = parser.parse(content, filename)
-        return {
-            "filename": filename,
-            "report": report.model_dump(mode="json"),
-        }
+        report = perf_parser.parse(content, filename)
+        return _json_response(PortfolioAnalysisResponse(filename=filename, report=report))
 
     except HTTPException:
         raise
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=400, detail=_error_text(e))
     except Exception as e:
-        logger.error("Portfolio analysis error: %s", e, exc_info=True)
+        logger.error("Portfolio analysis error: %s", _error_text(e), exc_info=True)
         raise HTTPException(
             status_code=500,
-            detail=f"Blad analizy portfela: {str(e)}",
+            detail=f"Blad analizy portfela: {_error_text(e)}",
         )
 
 
@@ -630,31 +1032,29 @@ async def ike_ikze_upload(
     Upload a mBank eMakler IKE/IKZE portfolio snapshot CSV.
     Returns parsed positions for portfolio analysis display.
     """
+    _check_upload_size(file)
     try:
-        content = await file.read()
+        await file.seek(0)
+        content = file.file
         filename = file.filename or "unknown"
 
-        parser = IkeIkzeParser()
-        if not parser.detect(content, filename):
+        if not ike_parser.detect(read_head(content), filename):
             raise HTTPException(
                 status_code=400,
                 detail="Plik nie wyglada na arkusz IKE/IKZE z mBank eMakler. "
                        "Oczekiwany format: CSV z sekcjami 'ike' / 'ikze' i pozycjami portfela.",
             )
 
-        report = parser.parse(content, filename)
-        return {
-            "filename": filename,
-            "report": report.model_dump(mode="json"),
-        }
+        report = ike_parser.parse(content, filename)
+        return _json_response({"filename": filename, "report": report})
 
     except HTTPException:
         raise
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=400, detail=_error_text(e))
     except Exception as e:
-        logger.error("IKE/IKZE parse error: %s", e, exc_info=True)
+        logger.error("IKE/IKZE parse error: %s", _error_text(e), exc_info=True)
         raise HTTPException(
             status_code=500,
-            detail=f"Blad parsowania pliku IKE/IKZE: {str(e)}",
+            detail=f"Blad parsowania pliku IKE/IKZE: {_error_text(e)}",
         )
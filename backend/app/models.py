@@ -5,12 +5,21 @@ All monetary values use Decimal for financial precision.
 
 from __future__ import annotations
 
+import sys
+from dataclasses import dataclass
 from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+# Shared Decimal constants (Decimals are immutable, so one object serves
+# every default and fallback instead of parsing a literal per row)
+ZERO = Decimal("0")
+ONE = Decimal("1")
 
 
 # ---------------------------------------------------------------------------
@@ -54,7 +63,7 @@ class UnifiedTransaction(BaseModel):
     quantity: Decimal = Field(description="Number of units (always positive)")
     price: Decimal = Field(description="Price per unit in original currency")
     currency: str = Field(description="Original currency code, e.g. USD, EUR")
-    commission: Decimal = Field(default=Decimal("0"), description="Commission in original currency")
+    commission: Decimal = Field(default=ZERO, description="Commission in original currency")
     commission_currency: Optional[str] = Field(default=None, description="Currency of commission (if different)")
 
     # Computed later by NBP service
@@ -63,15 +72,72 @@ class UnifiedTransaction(BaseModel):
     amount_pln: Optional[Decimal] = Field(default=None, description="Total value in PLN")
     commission_pln: Optional[Decimal] = Field(default=None, description="Commission in PLN")
 
-    class Config:
-        json_encoders = {Decimal: str}
+    @field_validator("symbol", "currency", "country")
+    @classmethod
+    def _intern(cls, value: Optional[str]) -> Optional[str]:
+        # A file has thousands of rows but only a handful of distinct codes
+        return sys.intern(value) if value is not None else None
+
+    @classmethod
+    def from_parser(cls, **fields: Any) -> UnifiedTransaction:
+        """Build a transaction from already-typed values, skipping validation.
+
+        Parser row builders and the app's synthetic transactions (manual and
+        Performance-supplemented buys) produce typed values (Decimal,
+        datetime, date, ActionType), so only the normalisation the validators
+        would apply is repeated here.
+        """
+        broker = fields["broker"]
+        if isinstance(broker, Enum):
+            fields["broker"] = broker.value
+        for key in ("symbol", "currency", "country"):
+            value = fields.get(key)
+            if value is not None:
+                fields[key] = sys.intern(value)
+        return cls.model_construct(**fields)
+
+
+# ---------------------------------------------------------------------------
+# Manual buy entry – user-provided historical purchase (API input)
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=4096)
+def normalize_code(value: str) -> str:
+    """Strip and uppercase a ticker/currency code.
+
+    Results are interned: the same few symbols repeat across entries, so they
+    share one string object and compare by identity in dict lookups.
+    """
+    return sys.intern(value.strip().upper())
+
+
+class ManualBuyEntry(BaseModel):
+    """One entry of the ``manual_buys`` JSON form field sent by the frontend."""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    symbol: str
+    trade_date: date = Field(alias="tradeDate")
+    quantity: Decimal = Field(gt=0)
+    price: Decimal = Field(gt=0)
+    currency: str = "USD"
+    commission: Decimal = ZERO
+
+    @field_validator("symbol", "currency")
+    @classmethod
+    def _normalize_code(cls, value: str) -> str:
+        value = normalize_code(value)
+        if not value:
+            raise ValueError("must not be empty")
+        return value
 
 
 # ---------------------------------------------------------------------------
 # FIFO matching result
 # ---------------------------------------------------------------------------
 
-class FifoMatch(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class FifoMatch:
     """Represents one matched pair: a (portion of) buy matched with a (portion of) sell."""
 
     symbol: str
@@ -103,7 +169,8 @@ class FifoMatch(BaseModel):
 # Dividend calculation result
 # ---------------------------------------------------------------------------
 
-class DividendResult(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class DividendResult:
     """Tax calculation for a single dividend event."""
 
     symbol: str
@@ -252,3 +319,26 @@ class PortfolioReport(BaseModel):
     year_summaries: list[YearSummary] = []
     symbol_summaries: list[SymbolLifetimeSummary] = []
     metrics: PortfolioMetrics
+
+
+# ---------------------------------------------------------------------------
+# API responses
+# ---------------------------------------------------------------------------
+
+@dataclass(slots=True)
+class FileSummary:
+    """Per-file parsing summary shown next to the tax report."""
+    filename: str
+    broker: str
+    transactions_count: int
+    buys: int
+    sells: int
+    dividends: int
+    wht: int
+    note: Optional[str] = None
+
+
+class CalculateResponse(BaseModel):
+    """Response body of /api/calculate."""
+    files: list[FileSummary]
+    report: TaxReport
@@ -1,15 +1,20 @@
 """
 Portfolio Analysis models for IBKR Performance/Portfolio Analyst reports.
 All monetary values use Decimal for financial precision.
+
+Row types (one instance per table row, thousands per report) are frozen,
+slotted pydantic dataclasses; the report containers stay BaseModels.
 """
 
 from __future__ import annotations
 
 from datetime import date
 from decimal import Decimal
+from functools import cached_property
 from typing import Optional
 
 from pydantic import BaseModel
+from pydantic.dataclasses import dataclass
 
 
 class PAKeyStatistics(BaseModel):
@@ -28,14 +33,16 @@ class PAKeyStatistics(BaseModel):
     fees: Decimal
 
 
-class PAMonthlyReturn(BaseModel):
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PAMonthlyReturn:
     """One row from Historical Performance (monthly/quarterly/yearly)."""
     period: str          # e.g. "202401", "2024 Q1", "2024"
     period_type: str     # "month", "quarter", "year"
     return_pct: Optional[Decimal] = None
 
 
-class PAOpenPosition(BaseModel):
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PAOpenPosition:
     """One holding from Open Position Summary."""
     symbol: str
     description: str
@@ -49,7 +56,8 @@ class PAOpenPosition(BaseModel):
     unrealized_pnl: Decimal
 
 
-class PATradeSummary(BaseModel):
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PATradeSummary:
     """Per-symbol trade summary."""
     financial_instrument: Optional[str] = None
     currency: Optional[str] = None
@@ -64,7 +72,8 @@ class PATradeSummary(BaseModel):
     proceeds_sold: Decimal
 
 
-class PADeposit(BaseModel):
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PADeposit:
     """One deposit/withdrawal entry."""
     entry_date: str
     account: str
@@ -73,7 +82,8 @@ class PADeposit(BaseModel):
     amount: Decimal
 
 
-class PADividend(BaseModel):
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PADividend:
     """One dividend entry."""
     pay_date: str
     ex_date: Optional[str] = None
@@ -85,7 +95,8 @@ class PADividend(BaseModel):
     amount: Decimal
 
 
-class PASymbolPerformance(BaseModel):
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PASymbolPerformance:
     """One row from Performance by Symbol."""
     symbol: str
     description: str
@@ -99,7 +110,8 @@ class PASymbolPerformance(BaseModel):
     is_open: bool
 
 
-class PADailyNav(BaseModel):
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PADailyNav:
     """One row from Allocation by Asset Class (daily NAV)."""
     nav_date: str
     commodities: Decimal
@@ -110,7 +122,8 @@ class PADailyNav(BaseModel):
     nav: Decimal
 
 
-class PACumulativeReturn(BaseModel):
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PACumulativeReturn:
     """One row from Cumulative Performance Statistics."""
     return_date: str
     cumulative_return_pct: Decimal
@@ -133,5 +146,13 @@ class PortfolioAnalysisReport(BaseModel):
     cumulative_returns: list[PACumulativeReturn] = []
     warnings: list[str] = []
 
-    class Config:
-        json_encoders = {Decimal: str}
+    @cached_property
+    def trade_lookup(self) -> dict[str, PATradeSummary]:
+        """Trade summaries keyed by symbol (built once per report)."""
+        return {ts.symbol: ts for ts in self.trade_summaries}
+
+
+class PortfolioAnalysisResponse(BaseModel):
+    """Response body of /api/portfolio-analysis."""
+    filename: str
+    report: PortfolioAnalysisReport
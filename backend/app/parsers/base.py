@@ -5,10 +5,69 @@ Abstract base parser. All broker-specific parsers extend this.
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import IO
+from functools import lru_cache
+from typing import IO, Iterable, Union
 
 from app.models import UnifiedTransaction
 
+# Uploaded file content: raw text, raw bytes, or a binary stream
+# (e.g. the SpooledTemporaryFile behind FastAPI's UploadFile).
+FileContent = Union[str, bytes, IO[bytes]]
+
+# How much of a file detect() gets to look at. Section headers and column
+# names all live at the top of broker exports, so a prefix is enough.
+DETECT_PROBE_SIZE = 64 * 1024
+
+
+def read_head(file_content: FileContent, size: int = DETECT_PROBE_SIZE) -> str | bytes:
+    """Return the first `size` bytes/chars without consuming a stream."""
+    if isinstance(file_content, (str, bytes)):
+        return file_content[:size]
+    pos = file_content.tell()
+    head = file_content.read(size)
+    file_content.seek(pos)
+    return head
+
+
+def decode_text(content: str | bytes) -> str:
+    """Decode bytes to string (UTF-8, falling back to Latin-1), dropping a BOM."""
+    if isinstance(content, str):
+        return content.lstrip("\ufeff")
+    for encoding in ("utf-8", "utf-8-sig", "latin-1"):
+        try:
+            return content.decode(encoding).lstrip("\ufeff")
+        except (UnicodeDecodeError, ValueError):
+            continue
+    return content.decode("latin-1").lstrip("\ufeff")
+
+
+# Upload classification runs several detect() calls over the same probe;
+# this lets them share one decode (bytes cache their hash, so hits are cheap).
+decode_head = lru_cache(maxsize=8)(decode_text)
+
+
+def has_markers(text: str, markers: Iterable[str], needed: int) -> bool:
+    """Return True once `needed` of `markers` occur in `text`.
+
+    Stops scanning at the first `needed` hits instead of counting them all.
+    """
+    if needed <= 0:
+        return True
+    for marker in markers:
+        if marker in text:
+            needed -= 1
+            if not needed:
+                return True
+    return False
+
+
+def read_all(file_content: FileContent) -> str | bytes:
+    """Return the full content, reading a stream from its start."""
+    if isinstance(file_content, (str, bytes)):
+        return file_content
+    file_content.seek(0)
+    return file_content.read()
+
 
 class BaseParser(ABC):
     """
@@ -24,10 +83,13 @@ class BaseParser(ABC):
     @staticmethod
     @abstractmethod
     def detect(file_content: str | bytes, filename: str = "") -> bool:
-        """Return True if this parser can handle the given file."""
+        """Return True if this parser can handle the given file.
+
+        May receive only a prefix of the file (see DETECT_PROBE_SIZE).
+        """
         ...
 
     @abstractmethod
-    def parse(self, file_content: str | bytes, filename: str = "") -> list[UnifiedTransaction]:
+    def parse(self, file_content: FileContent, filename: str = "") -> list[UnifiedTransaction]:
         """Parse raw file content into normalised transactions."""
         ...
@@ -5,8 +5,10 @@ Tries each registered parser's detect() method and returns the matching one.
 
 from __future__ import annotations
 
+from typing import Optional
+
 from app.models import UnifiedTransaction
-from app.parsers.base import BaseParser
+from app.parsers.base import BaseParser, FileContent, read_head
 from app.parsers.exante import ExanteParser
 from app.parsers.ibkr import IBKRParser
 
@@ -17,16 +19,34 @@ REGISTERED_PARSERS: list[type[BaseParser]] = [
 ]
 
 
-def detect_and_parse(file_content: str | bytes, filename: str = "") -> list[UnifiedTransaction]:
+def detect_and_parse(file_content: FileContent, filename: str = "") -> list[UnifiedTransaction]:
     """
     Auto-detect broker from file content and parse into unified transactions.
 
+    `file_content` may be a binary stream; detection only reads its prefix.
     Raises ValueError if no parser matches.
     """
+    parser = detect_parser(read_head(file_content), filename)()
+    return parser.parse(file_content, filename)
+
+
+def find_parser(head: str | bytes, filename: str = "") -> Optional[type[BaseParser]]:
+    """Return the parser class for a file given its prefix, or None."""
     for parser_cls in REGISTERED_PARSERS:
-        if parser_cls.detect(file_content, filename):
-            parser = parser_cls()
-            return parser.parse(file_content, filename)
+        if parser_cls.detect(head, filename):
+            return parser_cls
+    return None
+
+
+def detect_parser(head: str | bytes, filename: str = "") -> type[BaseParser]:
+    """
+    Return the parser class for a file, given its prefix (see read_head).
+
+    Raises ValueError if no parser matches.
+    """
+    parser_cls = find_parser(head, filename)
+    if parser_cls is not None:
+        return parser_cls
 
     raise ValueError(
         f"Could not detect broker format for file '{filename}'. "
@@ -24,16 +24,20 @@ All files are UTF-16 encoded (with BOM), tab-delimited, with quoted fields.
 
 from __future__ import annotations
 
+import codecs
+import csv
 import hashlib
+import io
 import logging
 import re
-from collections import defaultdict
 from datetime import date, datetime, timedelta
 from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from operator import attrgetter
 from typing import Optional
 
-from app.models import ActionType, BrokerName, UnifiedTransaction
-from app.parsers.base import BaseParser
+from app.models import ONE, ZERO, ActionType, BrokerName, UnifiedTransaction
+from app.parsers.base import BaseParser, FileContent, has_markers, read_all
 
 logger = logging.getLogger(__name__)
 
@@ -94,6 +98,16 @@ CLEAN_HEADERS = {
     "Identyfikator zlecenia wymiany": "ExchangeOrderID",
 }
 
+# Format 1 columns read by _parse_one_clean_trade, in unpacking order
+_CLEAN_TRADE_FIELDS = (
+    "When", "SymbolID", "InstrumentType", "TradeType", "Side", "Quantity", "Price",
+    "TradeVolume", "Currency", "Commission", "CommissionCurrency", "ISIN",
+    "SettlementDate",
+)
+
+SIX_PLACES = Decimal("0.000001")   # derived unit prices
+BOND_PRICE_TOLERANCE = Decimal("0.01")
+
 # Exante operation types we care about
 TRADE_OPS = {"TRADE"}
 COMMISSION_OPS = {"COMMISSION"}
@@ -104,19 +118,50 @@ SKIP_OPS = {"ROLLOVER", "CUSTODY FEE", "INTEREST", "FUNDING/WITHDRAWAL",
             "AUTOCONVERSION", "SUBACCOUNT TRANSFER", "BANK CHARGE"}
 
 
+# Thousands separators and stray whitespace seen in amounts; the \xa0
+# (non-breaking space) appears in some European-locale exports
+_DECIMAL_STRIP = str.maketrans("", "", ", \t\xa0")
+
+
+# The parse helpers below are memoised: an export repeats the same amounts,
+# timestamps and settlement dates across the asset/cash/commission rows of a
+# trade, and the results are immutable.
+@lru_cache(maxsize=4096)
 def _safe_decimal(value: str) -> Decimal:
     if not value or value.strip() in ("", "-", "--", "None"):
-        return Decimal("0")
-    cleaned = value.strip().replace(",", "").replace(" ", "")
+        return ZERO
+    cleaned = value.strip().translate(_DECIMAL_STRIP)
     try:
         return Decimal(cleaned)
     except InvalidOperation:
         logger.warning("Could not parse Exante decimal: %r", value)
-        return Decimal("0")
+        return ZERO
+
+
+@lru_cache(maxsize=4096)
+def _safe_decimal_abs(value: str) -> Decimal:
+    """Magnitude of an amount whose sign is implied by the row (volumes, fees)."""
+    return abs(_safe_decimal(value))
+
 
+def _is_iso_date(value: str) -> bool:
+    """True for the exact YYYY-MM-DD shape (what Exante writes)."""
+    return len(value) == 10 and value[4] == "-" and value[7] == "-"
 
+
+@lru_cache(maxsize=2048)
 def _parse_exante_datetime(value: str) -> datetime:
     value = value.strip().strip('"')
+    # fromisoformat is C-fast but also accepts ISO forms strptime rejects
+    # (week dates, offsets), so it only gets the two shapes below
+    if _is_iso_date(value) or (
+        len(value) == 19 and value[10] == " " and _is_iso_date(value[:10])
+        and value[13] == ":" and value[16] == ":"
+    ):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
     for fmt in (
         "%Y-%m-%d %H:%M:%S",
         "%Y-%m-%d",
@@ -128,14 +173,27 @@ def _parse_exante_datetime(value: str) -> datetime:
     raise ValueError(f"Cannot parse Exante datetime: {value!r}")
 
 
+@lru_cache(maxsize=2048)
 def _parse_date(value: str) -> date:
     """Parse a date string (YYYY-MM-DD) to date object."""
     value = value.strip().strip('"')
+    if _is_iso_date(value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
     return datetime.strptime(value, "%Y-%m-%d").date()
 
 
 def _make_id(data: str) -> str:
-    return hashlib.sha256(data.encode()).hexdigest()[:16]
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
+_BOM_ENCODINGS = (
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+)
 
 
 def _decode_exante(content: str | bytes) -> str:
@@ -143,7 +201,15 @@ def _decode_exante(content: str | bytes) -> str:
     if isinstance(content, str):
         return content
 
-    # Try UTF-16 first (Exante's default encoding)
+    # Exports normally start with a BOM, which names the encoding outright
+    for bom, encoding in _BOM_ENCODINGS:
+        if content.startswith(bom):
+            try:
+                return content.decode(encoding).lstrip("\ufeff")
+            except (UnicodeDecodeError, ValueError):
+                break
+
+    # No BOM (or undecodable): try UTF-16 first (Exante's default encoding)
     for encoding in ("utf-16", "utf-16-le", "utf-16-be", "utf-8-sig", "utf-8", "latin-1"):
         try:
             text = content.decode(encoding)
@@ -159,13 +225,22 @@ def _decode_exante(content: str | bytes) -> str:
 
 
 def _normalize_headers(headers: list[str], mapping: dict[str, str]) -> list[str]:
-    """Map Polish headers to canonical English using given mapping."""
-    result = []
-    for h in headers:
-        h_clean = h.strip().strip('"').strip()
-        canonical = mapping.get(h_clean, h_clean)
-        result.append(canonical)
-    return result
+    """Map Polish headers to canonical English using given mapping.
+
+    Headers come from the csv-tokenized, stripped rows, so no cleanup is needed.
+    """
+    return [mapping.get(h, h) for h in headers]
+
+
+@lru_cache(maxsize=32)
+def _clean_trade_indices(raw_headers: tuple[str, ...]) -> tuple[int, ...]:
+    """Column positions of _CLEAN_TRADE_FIELDS in a Format 1 header row (-1 if absent).
+
+    Cached: multi-section exports repeat the same header row per section.
+    """
+    headers = _normalize_headers(list(raw_headers), CLEAN_HEADERS)
+    positions = {name: i for i, name in enumerate(headers)}
+    return tuple(positions.get(name, -1) for name in _CLEAN_TRADE_FIELDS)
 
 
 def _estimate_settlement(trade_date: date) -> date:
@@ -179,11 +254,21 @@ def _estimate_settlement(trade_date: date) -> date:
     return settle
 
 
+# Cash legs of Exante trades use these; answered without the generic checks
+_CURRENCY_CODES = frozenset({
+    "USD", "EUR", "GBP", "PLN", "CHF", "JPY", "CAD", "AUD", "HKD", "SEK", "NOK", "DKK",
+})
+
+
 def _is_asset_symbol(asset: str) -> bool:
     """Check if asset value is a ticker symbol (not a currency code)."""
-    if not asset or asset.strip() in ("", "None"):
+    if not asset:
         return False
     asset = asset.strip()
+    if asset in _CURRENCY_CODES:
+        return False
+    if not asset or asset == "None":
+        return False
     # Currency codes are 3 uppercase letters
     if len(asset) == 3 and asset.isalpha() and asset.isupper():
         return False
@@ -191,6 +276,14 @@ def _is_asset_symbol(asset: str) -> bool:
     return True
 
 
+_FOREX_PAIR_RE = re.compile(r"[A-Z]{3}/[A-Z]{3}")
+_DIV_COUNTRY_RE = re.compile(r"DivCntry\s+(\w{2})")
+# Account ids: FCP0101.001 / XEQ1234 in filenames, WXS2094.00000 in content
+_ACCOUNT_FULL_RE = re.compile(r"([A-Z]{3}\d{4}\.\d{3})")
+_ACCOUNT_SHORT_RE = re.compile(r"([A-Z]{3}\d{4})")
+_ACCOUNT_CONTENT_RE = re.compile(r"([A-Z]{3}\d{4}\.\d{3,5})")
+
+
 def _is_forex_symbol(symbol: str) -> bool:
     """Check if a symbol is a forex pair (e.g. USD/PLN.E.FX, EUR/USD.E.FX)."""
     if not symbol:
@@ -198,9 +291,8 @@ def _is_forex_symbol(symbol: str) -> bool:
     s = symbol.strip().upper()
     if ".FX" in s or ".FOREX" in s:
         return True
-    if re.match(r"^[A-Z]{3}/[A-Z]{3}", s):
-        return True
-    return False
+    # Most symbols have no slash; only pairs like EUR/USD need the regex
+    return "/" in s and _FOREX_PAIR_RE.match(s) is not None
 
 
 _EXCHANGE_TO_COUNTRY = {
@@ -211,7 +303,7 @@ _EXCHANGE_TO_COUNTRY = {
 
 def _extract_country_from_comment(comment: str) -> Optional[str]:
     """Extract DivCntry from Exante dividend comment."""
-    match = re.search(r"DivCntry\s+(\w{2})", comment)
+    match = _DIV_COUNTRY_RE.search(comment)
     if match:
         return match.group(1).upper()
     return None
@@ -231,24 +323,90 @@ def _country_from_symbol(symbol: str) -> Optional[str]:
     return None
 
 
-def _is_clean_header(line: str) -> bool:
-    """Check if a line is a Format 1 (clean) header row."""
-    fields = [f.strip().strip('"').strip() for f in line.split("\t")]
-    # Must have Godzina (or similar time column) + Strona + Cena
-    has_time = any(f in ("Godzina", "Time") for f in fields)
-    has_side = any(f in ("Strona", "Side") for f in fields)
-    has_price = any(f in ("Cena", "Price") for f in fields)
-    has_symbol = any(f in ("ID symbolu", "SymbolID") for f in fields)
-    return has_time and has_side and has_price and has_symbol
-
-
-def _is_traditional_header(line: str) -> bool:
-    """Check if a line is a Format 2 (traditional) header row."""
-    fields = [f.strip().strip('"').strip() for f in line.split("\t")]
-    has_op_type = any(f in ("Rodzaj operacji", "OperationType", "Operation type") for f in fields)
-    has_amount = any(f in ("Suma", "Amount", "Kwota", "Sum") for f in fields)
-    has_asset = any(f in ("Aktywa", "Asset") for f in fields)
-    return has_op_type and has_amount and has_asset
+# Header cells identifying section header rows. Every row of the file is
+# checked, so the first set tested is one that data rows almost never hit.
+_CLEAN_TIME_FIELDS = frozenset({"Godzina", "Time"})
+_CLEAN_SIDE_FIELDS = frozenset({"Strona", "Side"})
+_CLEAN_PRICE_FIELDS = frozenset({"Cena", "Price"})
+_CLEAN_SYMBOL_FIELDS = frozenset({"ID symbolu", "SymbolID"})
+_TRAD_OP_TYPE_FIELDS = frozenset({"Rodzaj operacji", "OperationType", "Operation type"})
+_TRAD_AMOUNT_FIELDS = frozenset({"Suma", "Amount", "Kwota", "Sum"})
+_TRAD_ASSET_FIELDS = frozenset({"Aktywa", "Asset"})
+
+
+def _is_clean_header(fields: list[str]) -> bool:
+    """Check if a row is a Format 1 (clean) header row."""
+    # Must have Godzina (or similar time column) + Strona + Cena + symbol
+    return (
+        not _CLEAN_TIME_FIELDS.isdisjoint(fields)
+        and not _CLEAN_SIDE_FIELDS.isdisjoint(fields)
+        and not _CLEAN_PRICE_FIELDS.isdisjoint(fields)
+        and not _CLEAN_SYMBOL_FIELDS.isdisjoint(fields)
+    )
+
+
+# detect(): header names and account prefixes seen in Exante exports
+_DETECT_MARKERS = (
+    "Rodzaj operacji",
+    "OperationType",
+    "Operation type",
+    "ID symbolu",
+    "SymbolID",
+    "Symbol ID",
+    "Ekwiwalent EUR",
+    "EUR equivalent",
+    "XEQ",      # Exante account prefix
+    "WXS",      # Exante account prefix
+    "FCP",      # Exante account prefix
+    "WLQ",      # Exante account prefix
+    "Godzina",  # Format 1 time column
+    "Prowizje", # Format 1 commission column
+)
+
+
+def _is_traditional_header(fields: list[str]) -> bool:
+    """Check if a row is a Format 2 (traditional) header row."""
+    return (
+        not _TRAD_OP_TYPE_FIELDS.isdisjoint(fields)
+        and not _TRAD_AMOUNT_FIELDS.isdisjoint(fields)
+        and not _TRAD_ASSET_FIELDS.isdisjoint(fields)
+    )
+
+
+def _split_operations(
+    rows: list[dict[str, str]],
+) -> tuple[list[dict[str, str]], list[dict[str, str]], list[dict[str, str]], list[dict[str, str]]]:
+    """Bucket Format 2 rows by OperationType in one pass, keeping file order.
+
+    Returns (trade + commission, dividend, tax, corporate action) rows.
+    """
+    trades: list[dict[str, str]] = []
+    dividends: list[dict[str, str]] = []
+    taxes: list[dict[str, str]] = []
+    corporate: list[dict[str, str]] = []
+    for row in rows:
+        op = row.get("OperationType", "").upper()
+        if op in TRADE_OPS or op in COMMISSION_OPS:
+            trades.append(row)
+        elif op in DIVIDEND_OPS:
+            dividends.append(row)
+        elif op in TAX_OPS:
+            taxes.append(row)
+        elif op in CORPORATE_OPS:
+            corporate.append(row)
+    return trades, dividends, taxes, corporate
+
+
+class _TradeGroup:
+    """Rows making up one Format 2 trade: asset leg, cash leg and commission."""
+
+    __slots__ = ("asset_row", "cash_row", "commission", "commission_currency")
+
+    def __init__(self) -> None:
+        self.asset_row: Optional[dict[str, str]] = None
+        self.cash_row: Optional[dict[str, str]] = None
+        self.commission = ZERO
+        self.commission_currency = ""
 
 
 class ExanteParser(BaseParser):
@@ -260,71 +418,66 @@ class ExanteParser(BaseParser):
     def detect(file_content: str | bytes, filename: str = "") -> bool:
         text = _decode_exante(file_content)
 
-        indicators = [
-            "Rodzaj operacji",
-            "OperationType",
-            "Operation type",
-            "ID symbolu",
-            "SymbolID",
-            "Symbol ID",
-            "Ekwiwalent EUR",
-            "EUR equivalent",
-            "XEQ",      # Exante account prefix
-            "WXS",      # Exante account prefix
-            "FCP",      # Exante account prefix
-            "WLQ",      # Exante account prefix
-            "Godzina",  # Format 1 time column
-            "Prowizje", # Format 1 commission column
-        ]
-
         # Need at least 2 indicators for confidence
-        matches = sum(1 for ind in indicators if ind in text)
-        return matches >= 2
+        return has_markers(text, _DETECT_MARKERS, 2)
 
-    def parse(self, file_content: str | bytes, filename: str = "") -> list[UnifiedTransaction]:
-        text = _decode_exante(file_content)
+    def parse(self, file_content: FileContent, filename: str = "") -> list[UnifiedTransaction]:
+        text = _decode_exante(read_all(file_content))
 
-        lines = [l for l in text.split("\n") if l.strip()]
-        if not lines:
-            return []
-
-        # Scan for section headers (multi-section files have costs + trades + traditional)
+        # Tokenize once. Quote handling is off so a stray quote in a
+        # free-text cell (e.g. Comment) can't swallow the following lines;
+        # surrounding quotes are stripped per cell instead. Blank rows are
+        # dropped. Section headers are found in the same pass (multi-section
+        # files have costs + trades + traditional).
+        rows: list[list[str]] = []
         clean_sections = []      # (header_idx, header_fields) for Format 1
         traditional_sections = []  # header indices for Format 2
 
-        for i, line in enumerate(lines):
-            if _is_clean_header(line):
-                raw = [f.strip().strip('"').strip() for f in line.split("\t")]
-                clean_sections.append((i, raw))
-            elif _is_traditional_header(line):
-                traditional_sections.append(i)
+        # Most exports hold a single format; a header can only be present
+        # if its required column name occurs somewhere in the text.
+        may_have_clean = any(name in text for name in _CLEAN_TIME_FIELDS)
+        may_have_traditional = any(name in text for name in _TRAD_OP_TYPE_FIELDS)
+
+        for record in csv.reader(io.StringIO(text), delimiter="\t", quoting=csv.QUOTE_NONE):
+            cells = [cell.strip().strip('"').strip() for cell in record]
+            if not any(cells):
+                continue
+            if may_have_clean and _is_clean_header(cells):
+                clean_sections.append((len(rows), cells))
+            elif may_have_traditional and _is_traditional_header(cells):
+                traditional_sections.append(len(rows))
+            rows.append(cells)
+        if not rows:
+            return []
 
         # Parse Format 1 (clean trades) if present
         clean_trades: list[UnifiedTransaction] = []
         if clean_sections:
             first_trad = traditional_sections[0] if traditional_sections else None
-            clean_trades = self._parse_clean_sections(lines, clean_sections, first_trad)
+            clean_trades = self._parse_clean_sections(rows, clean_sections, first_trad)
             logger.info("Parsed %d clean-format trades from Exante", len(clean_trades))
 
-        # Parse Format 2 (traditional) if present — collect from ALL sections
+        # Parse Format 2 (traditional) if present — collect from ALL sections.
+        # Cells were stripped while tokenizing; the _process_* helpers read
+        # them as-is.
         traditional_rows: list[dict[str, str]] = []
         for sec_i, trad_idx in enumerate(traditional_sections):
-            raw_headers = lines[trad_idx].split("\t")
-            headers = _normalize_headers(raw_headers, POLISH_HEADERS)
+            headers = _normalize_headers(rows[trad_idx], POLISH_HEADERS)
 
             # Data goes until the next traditional section header (or end of file)
             if sec_i + 1 < len(traditional_sections):
                 end_idx = traditional_sections[sec_i + 1]
             else:
-                end_idx = len(lines)
+                end_idx = len(rows)
 
-            for line in lines[trad_idx + 1: end_idx]:
-                values = [v.strip().strip('"').strip() for v in line.split("\t")]
+            for values in rows[trad_idx + 1: end_idx]:
                 if len(values) < len(headers):
                     values.extend([""] * (len(headers) - len(values)))
                 row = dict(zip(headers, values))
                 traditional_rows.append(row)
 
+        trade_rows, dividend_rows, tax_rows, corporate_rows = _split_operations(traditional_rows)
+
         # Build transactions: merge both formats, deduplicating
         transactions: list[UnifiedTransaction] = []
 
@@ -334,7 +487,7 @@ class ExanteParser(BaseParser):
 
             # Supplement with Format 2 trades not present in Format 1
             if traditional_rows:
-                traditional_trades = self._process_trades(traditional_rows)
+                traditional_trades = self._process_trades(trade_rows)
                 # Dedup: match by (symbol, action, qty) within a 10-minute window
                 # Format 1 and Format 2 timestamps can differ by several minutes
                 for tx in traditional_trades:
@@ -355,32 +508,31 @@ class ExanteParser(BaseParser):
                         )
         elif traditional_rows:
             # Fallback: use Format 2 for trades
-            transactions.extend(self._process_trades(traditional_rows))
+            transactions.extend(self._process_trades(trade_rows))
 
         # Always use Format 2 for dividends, taxes, and corporate actions
         if traditional_rows:
-            transactions.extend(self._process_dividends(traditional_rows))
-            transactions.extend(self._process_taxes(traditional_rows))
-            transactions.extend(self._process_corporate_actions(traditional_rows))
+            transactions.extend(self._process_dividends(dividend_rows))
+            transactions.extend(self._process_taxes(tax_rows))
+            transactions.extend(self._process_corporate_actions(corporate_rows))
 
         # If no sections found, try legacy single-header format (old simple files)
-        if not clean_sections and not traditional_sections and lines:
+        if not clean_sections and not traditional_sections:
             logger.info("No section headers found, trying legacy single-header parse")
-            raw_headers = lines[0].split("\t")
-            headers = _normalize_headers(raw_headers, POLISH_HEADERS)
-            rows: list[dict[str, str]] = []
-            for line in lines[1:]:
-                values = [v.strip().strip('"').strip() for v in line.split("\t")]
+            headers = _normalize_headers(rows[0], POLISH_HEADERS)
+            legacy_rows: list[dict[str, str]] = []
+            for values in rows[1:]:
                 if len(values) < len(headers):
                     values.extend([""] * (len(headers) - len(values)))
                 row = dict(zip(headers, values))
-                rows.append(row)
-            transactions.extend(self._process_trades(rows))
-            transactions.extend(self._process_dividends(rows))
-            transactions.extend(self._process_taxes(rows))
-            transactions.extend(self._process_corporate_actions(rows))
+                legacy_rows.append(row)
+            trade_rows, dividend_rows, tax_rows, corporate_rows = _split_operations(legacy_rows)
+            transactions.extend(self._process_trades(trade_rows))
+            transactions.extend(self._process_dividends(dividend_rows))
+            transactions.extend(self._process_taxes(tax_rows))
+            transactions.extend(self._process_corporate_actions(corporate_rows))
 
-        transactions.sort(key=lambda t: t.trade_date)
+        transactions.sort(key=attrgetter("trade_date"))
 
         # Extract account ID to distinguish multiple Exante accounts
         account_id = self._extract_account_id(text, filename)
@@ -396,15 +548,15 @@ class ExanteParser(BaseParser):
     def _extract_account_id(text: str, filename: str) -> Optional[str]:
         """Extract Exante account ID from filename or file content."""
         # Try filename first: look for account-like patterns (e.g. FCP0101.001, XEQ1234.001)
-        m = re.search(r"([A-Z]{3}\d{4}\.\d{3})", filename.upper())
+        m = _ACCOUNT_FULL_RE.search(filename.upper())
         if m:
             return m.group(1)
-        m = re.search(r"([A-Z]{3}\d{4})", filename.upper())
+        m = _ACCOUNT_SHORT_RE.search(filename.upper())
         if m:
             return m.group(1)
         # Fallback: scan file content for account ID in "Identyfikator konta" column
         # Matches patterns like WXS2094.001 or FCP0101.001 (also WXS2094.00000)
-        account_ids = re.findall(r"([A-Z]{3}\d{4}\.\d{3,5})", text.upper())
+        account_ids = _ACCOUNT_CONTENT_RE.findall(text.upper())
         if account_ids:
             # Return the most common short form (XXX9999.001)
             from collections import Counter
@@ -422,7 +574,7 @@ class ExanteParser(BaseParser):
 
     def _parse_clean_sections(
         self,
-        lines: list[str],
+        rows: list[list[str]],
         clean_sections: list[tuple[int, list[str]]],
         traditional_idx: Optional[int],
     ) -> list[UnifiedTransaction]:
@@ -430,7 +582,7 @@ class ExanteParser(BaseParser):
         results: list[UnifiedTransaction] = []
 
         for sec_i, (header_idx, raw_headers) in enumerate(clean_sections):
-            headers = _normalize_headers(raw_headers, CLEAN_HEADERS)
+            indices = _clean_trade_indices(tuple(raw_headers))
 
             # Data rows go from header_idx+1 to next section header or traditional header
             if sec_i + 1 < len(clean_sections):
@@ -438,84 +590,82 @@ class ExanteParser(BaseParser):
             elif traditional_idx is not None:
                 end_idx = traditional_idx
             else:
-                end_idx = len(lines)
-
-            for line in lines[header_idx + 1: end_idx]:
-                values = [v.strip().strip('"').strip() for v in line.split("\t")]
-                if len(values) < len(headers):
-                    values.extend([""] * (len(headers) - len(values)))
-                row = dict(zip(headers, values))
+                end_idx = len(rows)
 
-                tx = self._parse_one_clean_trade(row)
+            for values in rows[header_idx + 1: end_idx]:
+                width = len(values)
+                cells = [values[i] if 0 <= i < width else "" for i in indices]
+                tx = self._parse_one_clean_trade(cells)
                 if tx:
                     results.append(tx)
 
         return results
 
-    def _parse_one_clean_trade(self, row: dict[str, str]) -> Optional[UnifiedTransaction]:
-        """Parse a single Format 1 trade row into a UnifiedTransaction."""
+    def _parse_one_clean_trade(self, cells: list[str]) -> Optional[UnifiedTransaction]:
+        """Parse a single Format 1 trade row into a UnifiedTransaction.
+
+        `cells` holds the row's values for _CLEAN_TRADE_FIELDS, in that order.
+        """
+        (
+            when_str, symbol, instrument_type, trade_type, side, quantity, price_str,
+            trade_volume_str, currency, commission_str, commission_currency, isin_val,
+            settle_str,
+        ) = cells
         try:
-            when_str = row.get("When", "").strip()
             if not when_str:
                 return None
 
-            symbol = row.get("SymbolID", "").strip()
             if not symbol:
                 return None
 
             # Skip forex and non-TRADE rows
-            instrument_type = row.get("InstrumentType", "").strip().upper()
-            trade_type = row.get("TradeType", "").strip().upper()
+            instrument_type = instrument_type.upper()
+            trade_type = trade_type.upper()
             if instrument_type == "FX_SPOT" or _is_forex_symbol(symbol):
                 return None
             if trade_type and trade_type != "TRADE":
                 return None
 
-            side = row.get("Side", "").strip().lower()
+            side = side.lower()
             if side not in ("buy", "sell"):
                 return None
 
             action = ActionType.BUY if side == "buy" else ActionType.SELL
 
-            qty = _safe_decimal(row.get("Quantity", "0"))
+            qty = _safe_decimal(quantity)
             if qty <= 0:
                 return None
-            qty = abs(qty)
 
-            price = _safe_decimal(row.get("Price", "0"))
+            price = _safe_decimal(price_str)
             if price <= 0:
                 return None
 
             # For bonds (ISIN-based symbols like US912810SP49.USD), Price is
             # a percentage of par value, not the actual unit price.
             # Use TradeVolume (actual cash amount) to derive the real price.
-            trade_volume = abs(_safe_decimal(row.get("TradeVolume", "0")))
+            trade_volume = _safe_decimal_abs(trade_volume_str)
             if trade_volume > 0 and qty > 0:
-                real_price = (trade_volume / qty).quantize(Decimal("0.000001"))
-                if abs(real_price - price) / price > Decimal("0.01"):
+                real_price = (trade_volume / qty).quantize(SIX_PLACES)
+                if abs(real_price - price) / price > BOND_PRICE_TOLERANCE:
                     # Price and TradeVolume/qty differ significantly → bond pricing
                     logger.info(
                         "Bond price adjustment for %s: Price=%s -> TradeVolume/Qty=%s",
-                        row.get("SymbolID", "?"), price, real_price,
+                        symbol, price, real_price,
                     )
                     price = real_price
 
-            currency = row.get("Currency", "USD").strip()
             if not currency or currency == "None":
                 currency = "USD"
 
-            commission = abs(_safe_decimal(row.get("Commission", "0")))
-            commission_currency = row.get("CommissionCurrency", "").strip()
+            commission = _safe_decimal_abs(commission_str)
             if not commission_currency or commission_currency == "None":
                 commission_currency = None
 
-            isin_val = row.get("ISIN", "").strip()
             isin = isin_val if isin_val and isin_val != "None" else None
 
             trade_dt = _parse_exante_datetime(when_str)
 
             # Use actual settlement date from report (much better than T+2 estimate)
-            settle_str = row.get("SettlementDate", "").strip()
             if settle_str:
                 try:
                     settle = _parse_date(settle_str)
@@ -526,7 +676,7 @@ class ExanteParser(BaseParser):
 
             row_id = _make_id(f"EX_CLEAN_{symbol}_{when_str}_{qty}_{price}")
 
-            return UnifiedTransaction(
+            return UnifiedTransaction.from_parser(
                 id=row_id,
                 broker=BrokerName.EXANTE,
                 symbol=symbol,
@@ -543,7 +693,7 @@ class ExanteParser(BaseParser):
             )
 
         except Exception as e:
-            logger.warning("Failed to parse clean Exante trade: %s – %s", row.get("SymbolID", "?"), e)
+            logger.warning("Failed to parse clean Exante trade: %s – %s", symbol or "?", e)
             return None
 
     def _process_trades(self, rows: list[dict[str, str]]) -> list[UnifiedTransaction]:
@@ -558,43 +708,38 @@ class ExanteParser(BaseParser):
         results: list[UnifiedTransaction] = []
 
         # Group: key = (timestamp, symbol_base)
-        groups: dict[str, dict] = defaultdict(lambda: {
-            "asset_row": None,
-            "cash_row": None,
-            "commission": Decimal("0"),
-            "commission_currency": "",
-        })
+        groups: dict[str, _TradeGroup] = {}
 
         for row in rows:
-            op = row.get("OperationType", "").strip().upper()
-            when = row.get("When", "").strip()
-            symbol_id = row.get("SymbolID", "").strip()
-            asset = row.get("Asset", "").strip()
-            amount = _safe_decimal(row.get("Amount", "0"))
+            op = row.get("OperationType", "").upper()
+            when = row.get("When", "")
+            symbol_id = row.get("SymbolID", "")
+            asset = row.get("Asset", "")
+
+            key = f"{when}|{symbol_id}"
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = _TradeGroup()
 
             if op == "TRADE":
                 # Determine if this is the asset line or cash line
                 if _is_asset_symbol(asset) and asset == symbol_id:
                     # Asset line: qty change
-                    key = f"{when}|{symbol_id}"
-                    groups[key]["asset_row"] = row
+                    group.asset_row = row
                 else:
                     # Cash line: currency amount
                     # Find the matching symbol from this timestamp
-                    key = f"{when}|{symbol_id}"
-                    groups[key]["cash_row"] = row
+                    group.cash_row = row
 
-            elif op == "COMMISSION":
-                # Find the group for this timestamp
+            else:
                 # Commission usually has same timestamp as the trade
                 # Try to match by timestamp and symbol
-                key = f"{when}|{symbol_id}"
-                groups[key]["commission"] = abs(amount)
-                groups[key]["commission_currency"] = asset if not _is_asset_symbol(asset) else ""
+                group.commission = _safe_decimal_abs(row.get("Amount", "0"))
+                group.commission_currency = asset if not _is_asset_symbol(asset) else ""
 
         for key, group in groups.items():
-            asset_row = group["asset_row"]
-            cash_row = group["cash_row"]
+            asset_row = group.asset_row
+            cash_row = group.cash_row
 
             if not asset_row:
                 continue
@@ -603,11 +748,11 @@ class ExanteParser(BaseParser):
                 when_str = asset_row.get("When", "")
                 trade_dt = _parse_exante_datetime(when_str)
 
-                symbol = asset_row.get("SymbolID", "").strip()
+                symbol = asset_row.get("SymbolID", "")
                 if _is_forex_symbol(symbol):
                     continue  # Skip forex conversions
 
-                isin_val = asset_row.get("ISIN", "").strip()
+                isin_val = asset_row.get("ISIN", "")
                 isin = isin_val if isin_val and isin_val != "None" else None
 
                 qty = _safe_decimal(asset_row.get("Amount", "0"))
@@ -616,30 +761,30 @@ class ExanteParser(BaseParser):
 
                 if qty < 0:
                     action = ActionType.SELL
-                    qty = abs(qty)
+                    qty = -qty
                 else:
                     action = ActionType.BUY
 
                 # Get price from cash row
                 if cash_row:
-                    cash_amount = abs(_safe_decimal(cash_row.get("Amount", "0")))
-                    currency = cash_row.get("Asset", "USD").strip()
+                    cash_amount = _safe_decimal_abs(cash_row.get("Amount", "0"))
+                    currency = cash_row.get("Asset", "USD")
                     if qty > 0:
-                        price = (cash_amount / qty).quantize(Decimal("0.000001"))
+                        price = (cash_amount / qty).quantize(SIX_PLACES)
                     else:
-                        price = Decimal("0")
+                        price = ZERO
                 else:
                     # Fallback: no cash row found
-                    price = Decimal("0")
+                    price = ZERO
                     currency = "USD"
 
-                commission = group["commission"]
+                commission = group.commission
                 settle = _estimate_settlement(trade_dt.date())
 
                 tx_id = asset_row.get("TransactionID", "")
                 row_id = _make_id(f"EX_{tx_id}_{symbol}_{when_str}")
 
-                results.append(UnifiedTransaction(
+                results.append(UnifiedTransaction.from_parser(
                     id=row_id,
                     broker=BrokerName.EXANTE,
                     symbol=symbol,
@@ -652,7 +797,7 @@ class ExanteParser(BaseParser):
                     price=price,
                     currency=currency,
                     commission=commission,
-                    commission_currency=group["commission_currency"] or None,
+                    commission_currency=group.commission_currency or None,
                 ))
 
             except Exception as e:
@@ -665,27 +810,23 @@ class ExanteParser(BaseParser):
         results: list[UnifiedTransaction] = []
 
         for row in rows:
-            op = row.get("OperationType", "").strip().upper()
-            if op not in DIVIDEND_OPS:
-                continue
-
             try:
-                symbol = row.get("SymbolID", "").strip()
+                symbol = row.get("SymbolID", "")
                 if not symbol or symbol == "None":
                     continue
 
-                when_str = row.get("When", "").strip()
+                when_str = row.get("When", "")
                 pay_dt = _parse_exante_datetime(when_str)
 
                 amount = _safe_decimal(row.get("Amount", "0"))
                 if amount <= 0:
                     continue  # Skip negative corrections
 
-                currency = row.get("Asset", "USD").strip()
+                currency = row.get("Asset", "USD")
                 if _is_asset_symbol(currency):
                     currency = "USD"  # Fallback
 
-                isin_val = row.get("ISIN", "").strip()
+                isin_val = row.get("ISIN", "")
                 isin = isin_val if isin_val and isin_val != "None" else None
 
                 comment = row.get("Comment", "")
@@ -694,7 +835,7 @@ class ExanteParser(BaseParser):
                 tx_id = row.get("TransactionID", "")
                 row_id = _make_id(f"EX_DIV_{tx_id}_{symbol}")
 
-                results.append(UnifiedTransaction(
+                results.append(UnifiedTransaction.from_parser(
                     id=row_id,
                     broker=BrokerName.EXANTE,
                     symbol=symbol,
@@ -704,10 +845,10 @@ class ExanteParser(BaseParser):
                     trade_date=pay_dt,
                     settlement_date=pay_dt.date(),
                     action=ActionType.DIVIDEND,
-                    quantity=abs(amount),
-                    price=Decimal("1"),
+                    quantity=amount,
+                    price=ONE,
                     currency=currency,
-                    commission=Decimal("0"),
+                    commission=ZERO,
                 ))
 
             except Exception as e:
@@ -720,17 +861,13 @@ class ExanteParser(BaseParser):
         results: list[UnifiedTransaction] = []
 
         for row in rows:
-            op = row.get("OperationType", "").strip().upper()
-            if op not in TAX_OPS:
-                continue
-
             try:
-                symbol = row.get("SymbolID", "").strip()
+                symbol = row.get("SymbolID", "")
                 if not symbol or symbol == "None":
                     # Tax recalculation rows without symbol – skip for now
                     continue
 
-                when_str = row.get("When", "").strip()
+                when_str = row.get("When", "")
                 pay_dt = _parse_exante_datetime(when_str)
 
                 amount = _safe_decimal(row.get("Amount", "0"))
@@ -739,11 +876,11 @@ class ExanteParser(BaseParser):
                 if amount >= 0:
                     continue
 
-                currency = row.get("Asset", "USD").strip()
+                currency = row.get("Asset", "USD")
                 if _is_asset_symbol(currency):
                     currency = "USD"
 
-                isin_val = row.get("ISIN", "").strip()
+                isin_val = row.get("ISIN", "")
                 isin = isin_val if isin_val and isin_val != "None" else None
 
                 comment = row.get("Comment", "")
@@ -752,7 +889,7 @@ class ExanteParser(BaseParser):
                 tx_id = row.get("TransactionID", "")
                 row_id = _make_id(f"EX_WHT_{tx_id}_{symbol}")
 
-                results.append(UnifiedTransaction(
+                results.append(UnifiedTransaction.from_parser(
                     id=row_id,
                     broker=BrokerName.EXANTE,
                     symbol=symbol,
@@ -762,10 +899,10 @@ class ExanteParser(BaseParser):
                     trade_date=pay_dt,
                     settlement_date=pay_dt.date(),
                     action=ActionType.TAX_WHT,
-                    quantity=abs(amount),
-                    price=Decimal("1"),
+                    quantity=-amount,
+                    price=ONE,
                     currency=currency,
-                    commission=Decimal("0"),
+                    commission=ZERO,
                 ))
 
             except Exception as e:
@@ -786,31 +923,28 @@ class ExanteParser(BaseParser):
         results: list[UnifiedTransaction] = []
 
         for row in rows:
-            op = row.get("OperationType", "").strip().upper()
-            if op not in CORPORATE_OPS:
-                continue
-
             try:
-                symbol = row.get("SymbolID", "").strip()
+                symbol = row.get("SymbolID", "")
                 if not symbol or symbol == "None":
                     continue
 
-                asset = row.get("Asset", "").strip()
+                asset = row.get("Asset", "")
                 # Only process asset-line rows (not currency rows)
                 if not _is_asset_symbol(asset):
                     continue
 
-                when_str = row.get("When", "").strip()
+                when_str = row.get("When", "")
                 action_dt = _parse_exante_datetime(when_str)
 
                 amount = _safe_decimal(row.get("Amount", "0"))
                 if amount == 0:
                     continue
 
-                isin_val = row.get("ISIN", "").strip()
+                isin_val = row.get("ISIN", "")
                 isin = isin_val if isin_val and isin_val != "None" else None
 
                 comment = row.get("Comment", "")
+                op = row.get("OperationType", "").upper()
 
                 if amount > 0:
                     action = ActionType.BUY
@@ -822,7 +956,7 @@ class ExanteParser(BaseParser):
                 tx_id = row.get("TransactionID", "")
                 row_id = _make_id(f"EX_CORP_{tx_id}_{symbol}_{amount}")
 
-                results.append(UnifiedTransaction(
+                results.append(UnifiedTransaction.from_parser(
                     id=row_id,
                     broker=BrokerName.EXANTE,
                     symbol=symbol,
@@ -832,9 +966,9 @@ class ExanteParser(BaseParser):
                     settlement_date=action_dt.date(),
                     action=action,
                     quantity=qty,
-                    price=Decimal("0"),
+                    price=ZERO,
                     currency="USD",
-                    commission=Decimal("0"),
+                    commission=ZERO,
                 ))
                 logger.info(
                     "Corporate action: %s %s %s %s qty=%s (%s)",
@@ -24,38 +24,73 @@ import logging
 import re
 from datetime import date, datetime, timedelta
 from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from operator import attrgetter
 from typing import Optional
 
-from app.models import ActionType, BrokerName, UnifiedTransaction
-from app.parsers.base import BaseParser
+from app.models import ONE, ZERO, ActionType, BrokerName, UnifiedTransaction
+from app.parsers.base import (
+    BaseParser,
+    FileContent,
+    decode_head,
+    decode_text,
+    has_markers,
+    read_all,
+)
 
 logger = logging.getLogger(__name__)
 
+# detect(): column names in a trade/cash header line, and Flex Query section markers
+_HEADER_MARKERS = ("TradePrice", "AssetClass", "TransactionID", "NetCash", "CurrencyPrimary")
+_DIVIDEND_MARKERS = ("Type", "Amount", "Symbol", "CurrencyPrimary")
+_FLEX_MARKERS = ("Trades,Header", "Statement,Header", "ClientAccountID", "AccountAlias")
+
 
 def _safe_decimal(value: str) -> Decimal:
     """Convert string to Decimal, handling commas and empty strings."""
     if not value or value.strip() in ("", "-", "--"):
-        return Decimal("0")
+        return ZERO
     cleaned = value.strip().replace(",", "")
     try:
         return Decimal(cleaned)
     except InvalidOperation:
         logger.warning("Could not parse decimal: %r", value)
-        return Decimal("0")
+        return ZERO
+
+
+# Most common first: pipe reports use the compact/ISO dates, Flex the ", " form
+_IBKR_DATETIME_FORMATS = (
+    "%Y%m%d",
+    "%Y-%m-%d",
+    "%Y-%m-%d, %H:%M:%S",
+    "%Y-%m-%d;%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y%m%d;%H%M%S",
+    "%Y%m%d %H%M%S",
+)
+
+_ISO_DATETIME_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})(?:(?:, |;| )(\d{2}):(\d{2}):(\d{2}))?")
+_COMPACT_DATETIME_RE = re.compile(r"(\d{4})(\d{2})(\d{2})(?:[; ](\d{2})(\d{2})(\d{2}))?")
 
 
+# Memoised: trade and settlement dates repeat across the rows of a report,
+# and datetime objects are immutable.
+@lru_cache(maxsize=4096)
 def _parse_ibkr_datetime(value: str) -> datetime:
     """Parse IBKR date/datetime strings in various formats."""
     value = value.strip().strip('"')
-    for fmt in (
-        "%Y-%m-%d, %H:%M:%S",
-        "%Y-%m-%d;%H:%M:%S",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y%m%d;%H%M%S",
-        "%Y%m%d %H%M%S",
-        "%Y-%m-%d",
-        "%Y%m%d",
-    ):
+    # Zero-padded forms of _IBKR_DATETIME_FORMATS are built directly;
+    # anything else (e.g. unpadded months) goes through strptime.
+    m = _ISO_DATETIME_RE.fullmatch(value) or _COMPACT_DATETIME_RE.fullmatch(value)
+    if m is not None:
+        year, month, day, hour, minute, second = m.groups(0)
+        try:
+            return datetime(
+                int(year), int(month), int(day), int(hour), int(minute), int(second),
+            )
+        except ValueError:
+            pass
+    for fmt in _IBKR_DATETIME_FORMATS:
         try:
             return datetime.strptime(value, fmt)
         except ValueError:
@@ -64,22 +99,64 @@ def _parse_ibkr_datetime(value: str) -> datetime:
 
 
 def _make_id(row_data: str) -> str:
-    return hashlib.sha256(row_data.encode()).hexdigest()[:16]
+    return hashlib.blake2b(row_data.encode(), digest_size=8).hexdigest()
+
 
+# Calendar days to the T+1 / T+2 business day, indexed by trade_date.weekday()
+_T1_CALENDAR_DAYS = (1, 1, 1, 1, 3, 2, 1)
+_T2_CALENDAR_DAYS = (2, 2, 2, 4, 4, 3, 2)
+_US_T1_CUTOFF = date(2024, 5, 28)
 
+
+@lru_cache(maxsize=1024)
 def _estimate_settlement_date(trade_date: date, currency: str) -> date:
     """Estimate settlement date: T+1 for US markets (post 2024-05-28), T+2 otherwise."""
-    us_currencies = ("USD",)
-    cutoff = date(2024, 5, 28)
-    offset = 1 if (currency in us_currencies and trade_date >= cutoff) else 2
-
-    settle = trade_date
-    days_added = 0
-    while days_added < offset:
-        settle += timedelta(days=1)
-        if settle.weekday() < 5:
-            days_added += 1
-    return settle
+    if currency == "USD" and trade_date >= _US_T1_CUTOFF:
+        days = _T1_CALENDAR_DAYS
+    else:
+        days = _T2_CALENDAR_DAYS
+    return trade_date + timedelta(days=days[trade_date.weekday()])
+
+
+# Forex pairs in trade reports: EUR.PLN, EUR.USD (dot-joined currency codes)
+_FOREX_SYMBOL_RE = re.compile(r"[A-Za-z]{3}(?:\.[A-Za-z]{3})+")
+
+# Columns read by _pipe_trade_to_transaction, in unpacking order, with the
+# value used when a row has no such column (as row.get(name, default) did)
+_PIPE_TRADE_FIELDS = (
+    ("AssetClass", ""),
+    ("Symbol", ""),
+    ("Quantity", "0"),
+    ("DateTime", None),
+    ("TradeDate", ""),
+    ("TradePrice", "0"),
+    ("CurrencyPrimary", "USD"),
+    ("NetCash", "0"),
+    ("TransactionID", ""),
+)
+_PIPE_TRADE_DEFAULTS = tuple(default for _, default in _PIPE_TRADE_FIELDS)
+
+
+@lru_cache(maxsize=32)
+def _header_positions(headers: tuple[str, ...]) -> dict[str, int]:
+    """Column index per header name; a repeated name keeps its last position,
+    as dict(zip(headers, row)) did. Shared across calls, so never mutate it."""
+    return {name: i for i, name in enumerate(headers)}
+
+
+@lru_cache(maxsize=32)
+def _pipe_trade_indices(headers: tuple[str, ...]) -> tuple[int, ...]:
+    """Column positions of _PIPE_TRADE_FIELDS in a header row (-1 if absent)."""
+    positions = _header_positions(headers)
+    return tuple(positions.get(name, -1) for name, _ in _PIPE_TRADE_FIELDS)
+
+
+def _pick_cells(
+    values: list[str], indices: tuple[int, ...], defaults: tuple[Optional[str], ...],
+) -> list[Optional[str]]:
+    """Values at `indices`, falling back to `defaults` for absent/short columns."""
+    width = len(values)
+    return [values[i] if 0 <= i < width else d for i, d in zip(indices, defaults)]
 
 
 class IBKRParser(BaseParser):
@@ -96,54 +173,33 @@ class IBKRParser(BaseParser):
 
     @staticmethod
     def detect(file_content: str | bytes, filename: str = "") -> bool:
-        text = _decode(file_content)
-        first_line = text.split("\n")[0]
-
-        ibkr_columns = [
-            "TradePrice",
-            "AssetClass",
-            "TransactionID",
-            "NetCash",
-            "CurrencyPrimary",
-        ]
+        text = decode_head(file_content)
+        first_line = text.partition("\n")[0]
 
         # Pipe-delimited IBKR
-        if "|" in first_line:
-            matches = sum(1 for ind in ibkr_columns if ind in first_line)
-            if matches >= 2:
-                return True
+        if "|" in first_line and has_markers(first_line, _HEADER_MARKERS, 2):
+            return True
 
         # Comma-delimited IBKR CSV (quoted or unquoted headers)
         clean_line = first_line.replace('"', '').replace("'", "")
-        if "," in clean_line:
-            matches = sum(1 for ind in ibkr_columns if ind in clean_line)
-            if matches >= 2:
-                return True
+        if "," in clean_line and has_markers(clean_line, _HEADER_MARKERS, 2):
+            return True
 
         # Flex Query CSV format (section markers)
-        flex_indicators = [
-            "Trades,Header",
-            "Statement,Header",
-            "ClientAccountID",
-            "AccountAlias",
-        ]
-        if any(ind in text for ind in flex_indicators):
+        if has_markers(text, _FLEX_MARKERS, 1):
             return True
 
         # Dividend/cash CSV with Type column (IBKR dividend files)
-        div_columns = ["Type", "Amount", "Symbol", "CurrencyPrimary"]
-        if "," in clean_line:
-            matches = sum(1 for ind in div_columns if ind in clean_line)
-            if matches >= 3:
-                return True
+        if "," in clean_line and has_markers(clean_line, _DIVIDEND_MARKERS, 3):
+            return True
 
         return False
 
-    def parse(self, file_content: str | bytes, filename: str = "") -> list[UnifiedTransaction]:
-        text = _decode(file_content)
+    def parse(self, file_content: FileContent, filename: str = "") -> list[UnifiedTransaction]:
+        text = decode_text(read_all(file_content))
 
         # Determine format
-        first_line = text.strip().split("\n")[0]
+        first_line = text.lstrip().partition("\n")[0]
 
         if "|" in first_line and "," not in first_line.split("|")[0]:
             # Pipe-delimited (older IBKR activity reports)
@@ -155,7 +211,7 @@ class IBKRParser(BaseParser):
             # Comma-delimited CSV (Flex Query output without section markers)
             transactions = self._parse_csv_delimited(text, filename)
 
-        transactions.sort(key=lambda t: t.trade_date)
+        transactions.sort(key=attrgetter("trade_date"))
         return transactions
 
     # ------------------------------------------------------------------
@@ -164,53 +220,67 @@ class IBKRParser(BaseParser):
 
     def _parse_pipe_delimited(self, text: str, filename: str = "") -> list[UnifiedTransaction]:
         """Parse pipe-delimited IBKR files."""
-        lines = [l.strip() for l in text.strip().split("\n") if l.strip()]
-        if not lines:
+        # Stream rows through csv (C tokenizer, honours quoted fields)
+        # rather than materialising a list of all lines
+        records = (
+            [v.strip() for v in record]
+            for record in csv.reader(io.StringIO(text), delimiter="|")
+        )
+        headers = next((record for record in records if any(record)), None)
+        if headers is None:
             return []
 
-        headers = [h.strip() for h in lines[0].split("|")]
         results: list[UnifiedTransaction] = []
 
         # Detect file type from headers
         has_trade_price = "TradePrice" in headers
         has_type_col = "Type" in headers
+        trade_indices = _pipe_trade_indices(tuple(headers))
 
-        for line in lines[1:]:
-            values = [v.strip() for v in line.split("|")]
+        for values in records:
+            if not any(values):
+                continue
             if len(values) < len(headers):
                 values.extend([""] * (len(headers) - len(values)))
-            row = dict(zip(headers, values))
 
             if has_trade_price and not has_type_col:
                 # This is a trades file
-                tx = self._pipe_trade_to_transaction(row)
+                tx = self._pipe_trade_to_transaction(
+                    _pick_cells(values, trade_indices, _PIPE_TRADE_DEFAULTS)
+                )
                 if tx:
                     results.append(tx)
             elif has_type_col:
                 # This is a dividends/cash file
-                txs = self._pipe_cash_to_transactions(row)
+                txs = self._pipe_cash_to_transactions(dict(zip(headers, values)))
                 results.extend(txs)
 
         return results
 
-    def _pipe_trade_to_transaction(self, row: dict[str, str]) -> Optional[UnifiedTransaction]:
-        """Convert a pipe-delimited trade row to UnifiedTransaction."""
+    def _pipe_trade_to_transaction(
+        self, cells: list[Optional[str]],
+    ) -> Optional[UnifiedTransaction]:
+        """Convert a pipe-delimited trade row to UnifiedTransaction.
+
+        `cells` holds the row's values for _PIPE_TRADE_FIELDS (see _pick_cells).
+        """
+        (
+            asset_class, symbol, quantity, date_time, trade_date, price_str,
+            currency, net_cash_str, tx_id,
+        ) = cells
         try:
-            asset_class = row.get("AssetClass", "").upper()
             # Skip forex/cash rows
-            if asset_class == "CASH":
+            if asset_class.upper() == "CASH":
                 return None
 
-            symbol = row.get("Symbol", "").strip()
+            symbol = symbol.strip()
             if not symbol:
                 return None
             # Skip forex symbols like EUR.PLN, EUR.USD
-            if "." in symbol and all(
-                len(part) == 3 and part.isalpha() for part in symbol.split(".")
-            ):
+            if _FOREX_SYMBOL_RE.fullmatch(symbol):
                 return None
 
-            qty = _safe_decimal(row.get("Quantity", "0"))
+            qty = _safe_decimal(quantity)
             if qty == 0:
                 return None
 
@@ -221,14 +291,14 @@ class IBKRParser(BaseParser):
                 action = ActionType.BUY
 
             # Prefer DateTime (has full timestamp) over TradeDate (date only)
-            trade_date_str = row.get("DateTime", row.get("TradeDate", ""))
+            trade_date_str = date_time if date_time is not None else trade_date
             if not trade_date_str:
                 return None
             trade_dt = _parse_ibkr_datetime(trade_date_str)
 
-            price = _safe_decimal(row.get("TradePrice", "0"))
-            currency = row.get("CurrencyPrimary", "USD").strip()
-            net_cash = _safe_decimal(row.get("NetCash", "0"))
+            price = _safe_decimal(price_str)
+            currency = currency.strip()
+            net_cash = _safe_decimal(net_cash_str)
 
             # Compute commission from NetCash:
             # For BUY: NetCash = -(price * qty + commission)  -> commission = -(NetCash) - price*qty
@@ -238,13 +308,12 @@ class IBKRParser(BaseParser):
                 commission = abs(net_cash) - expected_value
             else:
                 commission = expected_value - net_cash
-            commission = max(Decimal("0"), commission.quantize(Decimal("0.01")))
+            commission = max(ZERO, commission.quantize(Decimal("0.01")))
 
             settle = _estimate_settlement_date(trade_dt.date(), currency)
-            tx_id = row.get("TransactionID", "")
             row_id = _make_id(f"IBKR_{tx_id}_{symbol}_{trade_date_str}")
 
-            return UnifiedTransaction(
+            return UnifiedTransaction.from_parser(
                 id=row_id,
                 broker=BrokerName.IBKR,
                 symbol=symbol,
@@ -261,7 +330,7 @@ class IBKRParser(BaseParser):
             )
 
         except Exception as e:
-            logger.warning("Failed to parse IBKR pipe trade row: %s – %s", row, e)
+            logger.warning("Failed to parse IBKR pipe trade row: %s – %s", cells, e)
             return None
 
     def _pipe_cash_to_transactions(self, row: dict[str, str]) -> list[UnifiedTransaction]:
@@ -285,7 +354,7 @@ class IBKRParser(BaseParser):
 
             if tx_type == "Dividends" and symbol:
                 row_id = _make_id(f"IBKR_DIV_{tx_id}_{symbol}")
-                results.append(UnifiedTransaction(
+                results.append(UnifiedTransaction.from_parser(
                     id=row_id,
                     broker=BrokerName.IBKR,
                     symbol=symbol,
@@ -296,14 +365,14 @@ class IBKRParser(BaseParser):
                     settlement_date=pay_dt.date(),
                     action=ActionType.DIVIDEND,
                     quantity=abs(amount),
-                    price=Decimal("1"),
+                    price=ONE,
                     currency=currency,
-                    commission=Decimal("0"),
+                    commission=ZERO,
                 ))
 
             elif tx_type == "Withholding Tax" and symbol:
                 row_id = _make_id(f"IBKR_WHT_{tx_id}_{symbol}")
-                results.append(UnifiedTransaction(
+                results.append(UnifiedTransaction.from_parser(
                     id=row_id,
                     broker=BrokerName.IBKR,
                     symbol=symbol,
@@ -314,9 +383,9 @@ class IBKRParser(BaseParser):
                     settlement_date=pay_dt.date(),
                     action=ActionType.TAX_WHT,
                     quantity=abs(amount),
-                    price=Decimal("1"),
+                    price=ONE,
                     currency=currency,
-                    commission=Decimal("0"),
+                    commission=ZERO,
                 ))
 
             # Skip: Other Fees, Deposits/Withdrawals, Broker Interest, Broker Fees
@@ -406,23 +475,27 @@ class IBKRParser(BaseParser):
         self, parts: list[str], section: str, headers: list[str]
     ) -> list[UnifiedTransaction]:
         """Try to parse a data row using the given section type and header."""
-        row = dict(zip(headers, parts))
-
         if section == "trades":
-            buy_sell = row.get("Buy/Sell", "")
-            if buy_sell not in ("BUY", "SELL"):
+            header_key = tuple(headers)
+            buy_sell_idx = _header_positions(header_key).get("Buy/Sell", -1)
+            if not 0 <= buy_sell_idx < len(parts) or parts[buy_sell_idx] not in ("BUY", "SELL"):
                 return []
-            tx = self._pipe_trade_to_transaction(row)
+            indices = _pipe_trade_indices(header_key)
+            tx = self._pipe_trade_to_transaction(
+                _pick_cells(parts, indices, _PIPE_TRADE_DEFAULTS)
+            )
             return [tx] if tx else []
 
-        elif section == "transfers":
+        row = dict(zip(headers, parts))
+
+        if section == "transfers":
             direction = row.get("Direction", "").strip().upper()
             if direction not in ("IN", "OUT"):
                 return []
             tx = self._flex_transfer_to_transaction(row)
             return [tx] if tx else []
 
-        elif section == "dividends":
+        if section == "dividends":
             type_val = row.get("Type", "")
             if type_val not in ("Dividends", "Withholding Tax"):
                 return []
@@ -518,7 +591,7 @@ class IBKRParser(BaseParser):
 
             row_id = _make_id(f"IBKR_FLEX_{symbol}{trade_dt}{qty}{price}")
 
-            return UnifiedTransaction(
+            return UnifiedTransaction.from_parser(
                 id=row_id,
                 broker=BrokerName.IBKR,
                 symbol=symbol,
@@ -577,7 +650,7 @@ class IBKRParser(BaseParser):
                     isin_val = isin_match.group(1)
             country = isin_val[:2].upper() if isin_val and len(isin_val) >= 2 and isin_val[:2].isalpha() else None
 
-            return UnifiedTransaction(
+            return UnifiedTransaction.from_parser(
                 id=row_id,
                 broker=BrokerName.IBKR,
                 symbol=symbol,
@@ -588,9 +661,9 @@ class IBKRParser(BaseParser):
                 settlement_date=pay_dt.date(),
                 action=action,
                 quantity=abs(amount),
-                price=Decimal("1"),
+                price=ONE,
                 currency=currency,
-                commission=Decimal("0"),
+                commission=ZERO,
             )
         except Exception as e:
             logger.warning("Failed to parse IBKR flex div: %s – %s", row, e)
@@ -632,7 +705,7 @@ class IBKRParser(BaseParser):
             ))
 
             # Compute price from market value / qty
-            price = (market_value / qty).quantize(Decimal("0.0001")) if qty > 0 else Decimal("0")
+            price = (market_value / qty).quantize(Decimal("0.0001")) if qty > 0 else ZERO
 
             action = ActionType.BUY if direction_upper == "IN" else ActionType.SELL
             settle = _estimate_settlement_date(transfer_dt.date(), currency)
@@ -645,7 +718,7 @@ class IBKRParser(BaseParser):
                 direction, action.value, symbol, qty, price, currency, transfer_dt.date(), xfer_account,
             )
 
-            return UnifiedTransaction(
+            return UnifiedTransaction.from_parser(
                 id=row_id,
                 broker=BrokerName.IBKR,
                 symbol=symbol,
@@ -657,20 +730,8 @@ class IBKRParser(BaseParser):
                 quantity=qty,
                 price=price,
                 currency=currency,
-                commission=Decimal("0"),
+                commission=ZERO,
             )
         except Exception as e:
             logger.warning("Failed to parse IBKR flex transfer: %s – %s", row, e)
             return None
-
-
-def _decode(content: str | bytes) -> str:
-    """Decode bytes to string, handling various encodings."""
-    if isinstance(content, str):
-        return content.lstrip("\ufeff")
-    for encoding in ("utf-8", "utf-8-sig", "latin-1"):
-        try:
-            return content.decode(encoding).lstrip("\ufeff")
-        except (UnicodeDecodeError, ValueError):
-            continue
-    return content.decode("latin-1").lstrip("\ufeff")
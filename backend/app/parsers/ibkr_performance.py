@@ -30,22 +30,11 @@ from app.models_portfolio import (
     PATradeSummary,
     PortfolioAnalysisReport,
 )
+from app.parsers.base import FileContent, decode_head, decode_text, has_markers, read_all
 
 logger = logging.getLogger(__name__)
 
 
-def _decode(content: str | bytes) -> str:
-    """Decode bytes to string, handling various encodings."""
-    if isinstance(content, str):
-        return content.lstrip("\ufeff")
-    for encoding in ("utf-8", "utf-8-sig", "latin-1"):
-        try:
-            return content.decode(encoding).lstrip("\ufeff")
-        except (UnicodeDecodeError, ValueError):
-            continue
-    return content.decode("latin-1").lstrip("\ufeff")
-
-
 def _safe_decimal(value: str) -> Optional[Decimal]:
     """Convert string to Decimal, returning None for empty/dash values."""
     if not value or value.strip() in ("", "-", "--", "N/A"):
@@ -95,13 +84,15 @@ class IBKRPerformanceParser:
 
     @staticmethod
     def detect(file_content: str | bytes, filename: str = "") -> bool:
-        """Detect IBKR Performance Report by presence of characteristic sections."""
-        text = _decode(file_content)
-        matches = sum(1 for s in IBKRPerformanceParser.PERF_SECTIONS if s in text)
-        return matches >= 3
+        """Detect IBKR Performance Report by presence of characteristic sections.
+
+        Callers may pass only a prefix of the file (see parsers.base.read_head).
+        """
+        text = decode_head(file_content)
+        return has_markers(text, IBKRPerformanceParser.PERF_SECTIONS, 3)
 
-    def parse(self, file_content: str | bytes, filename: str = "") -> PortfolioAnalysisReport:
-        text = _decode(file_content)
+    def parse(self, file_content: FileContent, filename: str = "") -> PortfolioAnalysisReport:
+        text = decode_text(read_all(file_content))
         warnings: list[str] = []
 
         sections = self._split_into_sections(text)
@@ -21,6 +21,8 @@ from typing import Optional
 
 from pydantic import BaseModel
 
+from app.parsers.base import FileContent, read_all
+
 logger = logging.getLogger(__name__)
 
 # Exchange → country mapping
@@ -56,9 +58,6 @@ class IkeIkzeReport(BaseModel):
     positions: list[IkeIkzePosition] = []
     warnings: list[str] = []
 
-    class Config:
-        json_encoders = {Decimal: str}
-
 
 def _parse_polish_number(raw: str) -> Decimal:
     """Parse a Polish-formatted number: '4 866,00' → Decimal('4866.00')."""
@@ -88,7 +87,10 @@ class IkeIkzeParser:
 
     @staticmethod
     def detect(file_content: str | bytes, filename: str = "") -> bool:
-        """Return True if this looks like an IKE/IKZE portfolio snapshot."""
+        """Return True if this looks like an IKE/IKZE portfolio snapshot.
+
+        Callers may pass only a prefix of the file (see parsers.base.read_head).
+        """
         if isinstance(file_content, bytes):
             for enc in ("utf-8", "cp1250", "latin-1"):
                 try:
@@ -113,8 +115,9 @@ class IkeIkzeParser:
         has_pln_values = "PLN" in text
         return has_exchange or has_pln_values
 
-    def parse(self, file_content: str | bytes, filename: str = "") -> IkeIkzeReport:
+    def parse(self, file_content: FileContent, filename: str = "") -> IkeIkzeReport:
         """Parse the IKE/IKZE portfolio snapshot CSV."""
+        file_content = read_all(file_content)
         if isinstance(file_content, bytes):
             text = None
             for enc in ("utf-8", "cp1250", "latin-1"):
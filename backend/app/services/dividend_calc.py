@@ -11,7 +11,7 @@ import logging
 from decimal import ROUND_HALF_UP, Decimal
 from typing import Optional
 
-from app.models import ActionType, DividendResult, UnifiedTransaction
+from app.models import ONE, ZERO, ActionType, DividendResult, UnifiedTransaction
 
 logger = logging.getLogger(__name__)
 
@@ -53,26 +53,26 @@ class DividendCalculator:
             # Find matching WHT entry (same symbol, same date or close date)
             wht = self._find_matching_wht(div, wht_entries)
 
-            div_rate = div.nbp_rate or Decimal("1")
+            div_rate = div.nbp_rate or ONE
             gross_pln = (div.quantity * div.price * div_rate).quantize(
                 TWO_PLACES, ROUND_HALF_UP
             )
 
             if wht:
-                wht_rate = wht.nbp_rate or Decimal("1")
+                wht_rate = wht.nbp_rate or ONE
                 wht_amount = abs(wht.quantity * wht.price)
                 wht_pln = (wht_amount * wht_rate).quantize(
                     TWO_PLACES, ROUND_HALF_UP
                 )
             else:
-                wht_amount = Decimal("0")
-                wht_pln = Decimal("0")
-                wht_rate = Decimal("1")
+                wht_amount = ZERO
+                wht_pln = ZERO
+                wht_rate = ONE
 
             polish_tax = (gross_pln * POLISH_TAX_RATE).quantize(
                 TWO_PLACES, ROUND_HALF_UP
             )
-            to_pay = max(Decimal("0"), polish_tax - wht_pln)
+            to_pay = max(ZERO, polish_tax - wht_pln)
 
             country = div.country or _country_from_isin(div.isin)
 
@@ -15,14 +15,17 @@ import logging
 from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from decimal import ROUND_HALF_UP, Decimal
+from operator import attrgetter
 from typing import Optional
 
-from app.models import ActionType, FifoMatch, UnifiedTransaction
+from app.models import ONE, ZERO, ActionType, FifoMatch, UnifiedTransaction
 
 logger = logging.getLogger(__name__)
 
 TWO_PLACES = Decimal("0.01")
 
+_TRADE_ACTIONS = frozenset({ActionType.BUY, ActionType.SELL})
+
 
 def _is_option_symbol(symbol: str) -> bool:
     """
@@ -95,18 +98,23 @@ class FifoEngine:
         result = FifoResult()
 
         # Separate and sort
-        buys_sells = [
-            t for t in transactions if t.action in (ActionType.BUY, ActionType.SELL)
-        ]
-        buys_sells.sort(key=lambda t: t.trade_date)
+        buys_sells = [t for t in transactions if t.action in _TRADE_ACTIONS]
+        # Stable sort on the full timestamp: same-day trades keep intraday order
+        buys_sells.sort(key=attrgetter("trade_date"))
 
         # Buy queues per symbol (for regular long positions)
         buy_queues: dict[str, deque[BuyLot]] = defaultdict(deque)
         # Short sell queues per symbol (sells awaiting a covering buy)
         short_queues: dict[str, deque[ShortLot]] = defaultdict(deque)
 
+        # Bound once: the loop below runs per trade and per matched lot
+        buy, sell = ActionType.BUY, ActionType.SELL
+        add_match = result.matches.append
+        create_match = self._create_match
+
         for tx in buys_sells:
-            if tx.action == ActionType.BUY:
+            action = tx.action
+            if action is buy:
                 buy_remaining = tx.quantity
                 short_queue = short_queues.get(tx.symbol)
 
@@ -116,7 +124,7 @@ class FifoEngine:
                         short_lot = short_queue[0]
                         matched_qty = min(buy_remaining, short_lot.remaining_qty)
 
-                        match = self._create_match(
+                        match = create_match(
                             symbol=tx.symbol,
                             quantity=matched_qty,
                             buy_tx=tx,
@@ -125,7 +133,7 @@ class FifoEngine:
                             sell_total_qty=short_lot.transaction.quantity,
                         )
                         match.is_short = True
-                        result.matches.append(match)
+                        add_match(match)
 
                         short_lot.remaining_qty -= matched_qty
                         buy_remaining -= matched_qty
@@ -139,16 +147,16 @@ class FifoEngine:
                         BuyLot(transaction=tx, remaining_qty=buy_remaining)
                     )
 
-            elif tx.action == ActionType.SELL:
+            elif action is sell:
                 sell_remaining = tx.quantity
-                queue = buy_queues.get(tx.symbol, deque())
+                queue = buy_queues.get(tx.symbol)
 
                 # Regular FIFO: match against buy queue
                 while sell_remaining > 0 and queue:
                     lot = queue[0]
                     matched_qty = min(sell_remaining, lot.remaining_qty)
 
-                    match = self._create_match(
+                    match = create_match(
                         symbol=tx.symbol,
                         quantity=matched_qty,
                         buy_tx=lot.transaction,
@@ -156,7 +164,7 @@ class FifoEngine:
                         buy_total_qty=lot.transaction.quantity,
                         sell_total_qty=tx.quantity,
                     )
-                    result.matches.append(match)
+                    add_match(match)
 
                     lot.remaining_qty -= matched_qty
                     sell_remaining -= matched_qty
@@ -221,7 +229,7 @@ class FifoEngine:
         Revenue is calculated normally; cost basis is 0.
         Polish tax law: sell revenue is taxable even without proof of purchase.
         """
-        sell_rate = sell_tx.nbp_rate or Decimal("1")
+        sell_rate = sell_tx.nbp_rate or ONE
 
         # Proportional commission allocation for the orphan portion
         sell_commission_share = (
@@ -237,11 +245,11 @@ class FifoEngine:
             quantity=quantity,
             buy_date=sell_tx.trade_date,       # unknown – use sell date
             buy_settlement_date=sell_tx.settlement_date,
-            buy_price=Decimal("0"),
+            buy_price=ZERO,
             buy_currency=sell_tx.currency,
-            buy_commission=Decimal("0"),
-            buy_nbp_rate=Decimal("0"),
-            buy_cost_pln=Decimal("0"),
+            buy_commission=ZERO,
+            buy_nbp_rate=ZERO,
+            buy_cost_pln=ZERO,
             sell_date=sell_tx.trade_date,
             sell_settlement_date=sell_tx.settlement_date,
             sell_price=sell_tx.price,
@@ -269,8 +277,8 @@ class FifoEngine:
         Commission is allocated proportionally when a transaction
         is split across multiple matches.
         """
-        buy_rate = buy_tx.nbp_rate or Decimal("1")
-        sell_rate = sell_tx.nbp_rate or Decimal("1")
+        buy_rate = buy_tx.nbp_rate or ONE
+        sell_rate = sell_tx.nbp_rate or ONE
 
         # Proportional commission allocation
         buy_commission_share = (
@@ -13,7 +13,7 @@ import sqlite3
 from datetime import date, timedelta
 from decimal import Decimal
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
 import httpx
 
@@ -37,6 +37,9 @@ FIXED_HOLIDAYS = {
 
 DB_PATH = Path(__file__).parent.parent.parent / "nbp_cache.db"
 
+# Max dates per "IN (...)" query in _get_cached_rates
+_SQL_BATCH = 500
+
 
 def _easter_date(year: int) -> date:
     """Compute Easter Sunday using the Anonymous Gregorian algorithm."""
@@ -113,10 +116,18 @@ class NbpClient:
     def __init__(self, db_path: Path = DB_PATH):
         self.db_path = db_path
         self._init_db()
-        self._http = httpx.Client(timeout=30.0)
+        # One pooled, keep-alive connection set for every NBP request
+        self._http = httpx.Client(
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=8),
+        )
         # In-memory cache for holidays per year
         self._holidays_cache: dict[int, set[date]] = {}
 
+    def close(self) -> None:
+        """Close the pooled HTTP connections."""
+        self._http.close()
+
     def _init_db(self) -> None:
         with sqlite3.connect(str(self.db_path)) as conn:
             conn.execute("""
@@ -138,6 +149,26 @@ class NbpClient:
             return Decimal(row[0])
         return None
 
+    def _get_cached_rates(
+        self, currency: str, rate_dates: Iterable[date],
+    ) -> dict[date, Decimal]:
+        """Look up many dates for one currency over a single connection."""
+        keys = sorted({d.isoformat() for d in rate_dates})
+        found: dict[date, Decimal] = {}
+        with sqlite3.connect(str(self.db_path)) as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    "SELECT rate_date, mid_rate FROM nbp_rates "
+                    f"WHERE currency = ? AND rate_date IN ({placeholders})",
+                    (currency.upper(), *batch),
+                ).fetchall()
+                for rate_date, mid_rate in rows:
+                    found[date.fromisoformat(rate_date)] = Decimal(mid_rate)
+        return found
+
     def _cache_rate(self, currency: str, rate_date: date, mid_rate: Decimal) -> None:
         with sqlite3.connect(str(self.db_path)) as conn:
             conn.execute(
@@ -239,6 +270,42 @@ class NbpClient:
             f"after searching back to {candidate}"
         )
 
+    def get_rates(
+        self,
+        currency: str,
+        for_dates: Iterable[date],
+        errors: Optional[dict[date, ValueError]] = None,
+    ) -> dict[date, tuple[Decimal, date]]:
+        """
+        Batch version of get_rate() for one currency.
+
+        Cached rates are read in one query; only the misses go through
+        get_rate() and the API. Dates for which no rate can be found are
+        left out of the result; if `errors` is given, get_rate()'s error for
+        each of them is stored there so callers need not repeat the lookup.
+        """
+        currency = currency.upper()
+        for_dates = set(for_dates)
+        if currency == "PLN":
+            return {d: (Decimal("1"), d) for d in for_dates}
+
+        targets = {d: previous_business_day(d) for d in for_dates}
+        cached = self._get_cached_rates(currency, targets.values())
+
+        result: dict[date, tuple[Decimal, date]] = {}
+        for for_date, target in targets.items():
+            rate = cached.get(target)
+            if rate is not None:
+                result[for_date] = (rate, target)
+                continue
+            try:
+                result[for_date] = self.get_rate(currency, for_date)
+            except ValueError as e:
+                logger.warning("%s", e)
+                if errors is not None:
+                    errors[for_date] = e
+        return result
+
     def get_rate_for_settlement(
         self,
         currency: str,
@@ -6,12 +6,15 @@ Aggregates FIFO matches and dividend results into PIT-38 and PIT/ZG output.
 
 from __future__ import annotations
 
+import logging
 import math
 from collections import defaultdict
+from datetime import date
 from decimal import ROUND_HALF_UP, Decimal
 from typing import Optional
 
 from app.models import (
+    ONE,
     ActionType,
     CapitalGainsSummary,
     CountryBreakdown,
@@ -28,6 +31,8 @@ from app.services.fifo_engine import FifoEngine, FifoResult
 from app.services.nbp_client import NbpClient
 from app.services.portfolio_analytics import PortfolioAnalytics
 
+logger = logging.getLogger(__name__)
+
 TWO_PLACES = Decimal("0.01")
 POLISH_TAX_RATE = Decimal("0.19")
 
@@ -266,9 +271,54 @@ class TaxReportGenerator:
             except Exception as e:
                 warnings.append(f"Nie udalo sie pobrac kursow NBP za {year}: {e}")
 
+        # Resolve every (currency, settlement date) pair up front, one batch
+        # per currency, instead of a cache round-trip per transaction.
+        needed: dict[str, set[date]] = defaultdict(set)
+        for tx in transactions:
+            currency = tx.currency.upper()
+            if currency == "PLN":
+                continue
+            needed[currency].add(tx.settlement_date)
+            comm_currency = (tx.commission_currency or currency).upper()
+            if comm_currency != "PLN":
+                needed[comm_currency].add(tx.settlement_date)
+        # Lookups that failed are remembered too, so a missing rate costs one
+        # API walk per (currency, date) rather than one per transaction.
+        rates: dict[tuple[str, date], tuple[Decimal, date]] = {}
+        failures: dict[tuple[str, date], ValueError] = {}
+        for currency, dates in needed.items():
+            errors: dict[date, ValueError] = {}
+            try:
+                found = self.nbp.get_rates(currency, dates, errors)
+            except Exception as e:
+                # e.g. a cache database error; per-transaction lookups below
+                # still get their own error handling
+                logger.warning("Batch NBP lookup for %s failed: %s", currency, e)
+                continue
+            for d, rate in found.items():
+                rates[(currency, d)] = rate
+            for d, err in errors.items():
+                failures[(currency, d)] = err
+
+        def get_rate(currency: str, for_date: date) -> tuple[Decimal, date]:
+            key = (currency, for_date)
+            cached = rates.get(key)
+            if cached is not None:
+                return cached
+            failed = failures.get(key)
+            if failed is not None:
+                raise failed
+            try:
+                rates[key] = self.nbp.get_rate(currency, for_date)
+            except ValueError as e:
+                failures[key] = e
+                raise
+            return rates[key]
+
         for tx in transactions:
-            if tx.currency.upper() == "PLN":
-                tx.nbp_rate = Decimal("1")
+            currency = tx.currency.upper()
+            if currency == "PLN":
+                tx.nbp_rate = ONE
                 tx.nbp_rate_date = tx.settlement_date
                 tx.amount_pln = (tx.price * tx.quantity).quantize(
                     TWO_PLACES, ROUND_HALF_UP
@@ -277,22 +327,22 @@ class TaxReportGenerator:
                 continue
 
             try:
-                rate, rate_date = self.nbp.get_rate(tx.currency, tx.settlement_date)
+                rate, rate_date = get_rate(currency, tx.settlement_date)
                 tx.nbp_rate = rate
                 tx.nbp_rate_date = rate_date
                 tx.amount_pln = (tx.price * tx.quantity * rate).quantize(
                     TWO_PLACES, ROUND_HALF_UP
                 )
                 # Handle commission in different currency
-                comm_currency = tx.commission_currency or tx.currency
-                if comm_currency.upper() == tx.currency.upper():
+                comm_currency = (tx.commission_currency or currency).upper()
+                if comm_currency == currency:
                     tx.commission_pln = (tx.commission * rate).quantize(
                         TWO_PLACES, ROUND_HALF_UP
                     )
-                elif comm_currency.upper() == "PLN":
+                elif comm_currency == "PLN":
                     tx.commission_pln = tx.commission
                 else:
-                    comm_rate, _ = self.nbp.get_rate(comm_currency, tx.settlement_date)
+                    comm_rate, _ = get_rate(comm_currency, tx.settlement_date)
                     tx.commission_pln = (tx.commission * comm_rate).quantize(
                         TWO_PLACES, ROUND_HALF_UP
                     )
@@ -300,7 +350,7 @@ class TaxReportGenerator:
                 warnings.append(
                     f"Blad kursu NBP dla {tx.symbol} na dzien {tx.settlement_date}: {e}"
                 )
-                tx.nbp_rate = Decimal("1")
+                tx.nbp_rate = ONE
                 tx.amount_pln = (tx.price * tx.quantity).quantize(
                     TWO_PLACES, ROUND_HALF_UP
                 )